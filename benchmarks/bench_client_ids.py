@@ -0,0 +1,75 @@
+"""Benchmark client ID generation on a synthetic MP3 library.
+
+Client IDs were previously generated serially for every local song.
+Results are checked against serial generation.
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from google_music_proto.musicmanager.utils import generate_client_id
+
+from google_music_scripts.cache import LocalIndex
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz frame header.
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x64'
+MP3_FRAME_SIZE = 417
+
+
+def make_library(dirpath, size, *, num_frames=2000):
+	filepaths = []
+	for i in range(size):
+		frame = MP3_FRAME_HEADER + i.to_bytes(4, 'big') * ((MP3_FRAME_SIZE - 4) // 4)
+		frame = frame.ljust(MP3_FRAME_SIZE, b'\x00')
+
+		filepath = dirpath / f'{i:05}.mp3'
+		filepath.write_bytes(frame * num_frames)
+		filepaths.append(filepath)
+
+	return filepaths
+
+
+def client_ids(filepaths, workers):
+	with tempfile.TemporaryDirectory() as tempdir:
+		with LocalIndex(filepath=Path(tempdir) / 'local-index.sqlite') as local_index:
+			return dict(local_index.client_ids(filepaths, workers=workers))
+
+
+def timeit(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	# At least a few processes to exercise the pool on small machines.
+	workers = max(os.cpu_count() or 1, 4)
+
+	print(f"{'songs':>8} {'serial':>10} {'1 worker':>10} {f'{workers} workers':>12}")
+
+	for size in [100, 1000]:
+		with tempfile.TemporaryDirectory() as tempdir:
+			filepaths = make_library(Path(tempdir), size)
+
+			serial_time, serial_result = timeit(
+				lambda: {
+					filepath: generate_client_id(filepath)
+					for filepath in filepaths
+				}
+			)
+			single_time, single_result = timeit(client_ids, filepaths, 1)
+			pool_time, pool_result = timeit(client_ids, filepaths, workers)
+
+			assert single_result == pool_result == serial_result
+			assert len(set(serial_result.values())) == size
+
+			print(
+				f'{size:>8} {serial_time:>9.3f}s {single_time:>9.3f}s {pool_time:>11.3f}s'
+			)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,221 @@
+"""Benchmark command phases and whole commands against fake Google Music clients.
+
+A synthetic tagged MP3/FLAC library of each size is created locally.
+The fake Music Manager and Mobile Client libraries contain every other
+local song plus a quarter of the size in songs that aren't local.
+Each phase of a sync (scan, hash, listing, compare, sort, transfer)
+is timed with the core functions, then the delete, download, search,
+and upload commands are timed end to end with fresh fakes.
+
+Usage:
+	python benchmarks/bench_commands.py [--sizes 1000 10000 100000]
+		[--latency MS] [--failure-rate RATE] [--max-concurrency NUM]
+		[--workers NUM]
+"""
+
+import argparse
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import google_music
+from loguru import logger
+from natsort import natsorted
+
+import google_music_scripts.config as gms_config
+from fakes import FakeMobileClient, FakeMusicManager
+from google_music_scripts import cli, commands
+from google_music_scripts.cache import LibrarySnapshot, LocalIndex
+from google_music_scripts.compare import compare_metadata
+from google_music_scripts.core import download_songs, get_local_songs, upload_songs
+from synthetic import make_tree
+
+PHASES = ['scan', 'hash', 'listing', 'compare', 'sort', 'upload', 'download']
+COMMANDS = ['upload', 'download', 'search', 'delete']
+
+
+@contextmanager
+def timed(timings, name):
+	start = time.perf_counter()
+
+	try:
+		yield
+	finally:
+		timings[name] = time.perf_counter() - start
+
+
+@contextmanager
+def fake_google_music(tempdir, nums, **fake_kwargs):
+	"""Patch google_music clients and data/config directories for a benchmark run."""
+
+	mm = FakeMusicManager(nums, **fake_kwargs)
+	mc = FakeMobileClient(nums, **fake_kwargs)
+
+	patches = [
+		(google_music, 'musicmanager', lambda *args, **kwargs: mm),
+		(google_music, 'mobileclient', lambda *args, **kwargs: mc),
+		(gms_config, 'CONFIG_BASE_PATH', tempdir / 'config'),
+		(gms_config, 'DATA_BASE_PATH', tempdir / 'data'),
+	]
+
+	originals = [
+		(obj, attr, getattr(obj, attr))
+		for obj, attr, _ in patches
+	]
+
+	for obj, attr, value in patches:
+		setattr(obj, attr, value)
+
+	try:
+		yield mm, mc
+	finally:
+		for obj, attr, value in originals:
+			setattr(obj, attr, value)
+
+
+def command_args(argv):
+	parsed = cli.parse_args(cli.gms, argv)
+	cli.check_args(parsed)
+
+	return cli.merge_defaults(cli.default_args(parsed), parsed)
+
+
+def run_phases(root, tempdir, nums, options):
+	timings = {}
+
+	with fake_google_music(
+		tempdir,
+		nums,
+		latency=options.latency,
+		failure_rate=options.failure_rate,
+		max_concurrency=options.max_concurrency
+	) as (mm, mc):
+		local_index = LocalIndex(filepath=tempdir / 'local-index.sqlite')
+
+		with timed(timings, 'scan'):
+			local_songs = get_local_songs([root], local_index=local_index)
+
+		with timed(timings, 'hash'):
+			local_client_ids = dict(local_index.client_ids(local_songs))
+
+		with timed(timings, 'listing'):
+			snapshot = LibrarySnapshot(
+				filepath=tempdir / 'library-snapshot.sqlite',
+				refresh=True
+			)
+			mc_songs = snapshot.songs(mc)
+			mm_songs = snapshot.songs(mm)
+			snapshot.close()
+
+		with timed(timings, 'compare'):
+			google_client_ids = {song['clientId'] for song in mc_songs}
+			missing_songs = [
+				song
+				for song in local_songs
+				if local_client_ids[song] not in google_client_ids
+			]
+			missing_songs, _ = compare_metadata(
+				missing_songs,
+				mm_songs,
+				src_tags=local_index.tags
+			)
+
+		with timed(timings, 'sort'):
+			to_upload = natsorted(missing_songs)
+
+		local_index.close()
+
+		with timed(timings, 'upload'):
+			upload_songs(mm, to_upload, workers=options.workers)
+
+		with timed(timings, 'download'):
+			download_songs(
+				mm,
+				mm_songs,
+				str(tempdir / 'download' / '%artist%' / '%album%' / '%title%'),
+				workers=options.workers
+			)
+
+	return timings
+
+
+def run_commands(root, tempdir, nums, options):
+	argvs = {
+		'upload': ['upload', str(root), '--workers', str(options.workers)],
+		'download': [
+			'download',
+			'-o', str(root / '%artist%' / '%album%' / '%title%'),
+			'--workers', str(options.workers),
+		],
+		'search': ['search', '-y'],
+		'delete': ['delete', '-y', '--workers', str(options.workers)],
+	}
+
+	timings = {}
+	for command in COMMANDS:
+		with tempfile.TemporaryDirectory() as command_dir:
+			command_dir = Path(command_dir)
+
+			with fake_google_music(
+				command_dir,
+				nums,
+				latency=options.latency,
+				failure_rate=options.failure_rate,
+				max_concurrency=options.max_concurrency
+			):
+				args = command_args(argvs[command])
+				func = getattr(commands, f'do_{command}')
+
+				with timed(timings, command):
+					func(args)
+
+	return timings
+
+
+def print_table(title, names, results):
+	print(f"{title:<10}" + ''.join(f'{size:>12}' for size in results))
+
+	for name in names:
+		print(
+			f"{name:<10}"
+			+ ''.join(
+				f'{timings[name]:>11.3f}s'
+				for timings in results.values()
+			)
+		)
+
+	print()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+	parser.add_argument('--latency', metavar='MS', type=float, default=0)
+	parser.add_argument('--failure-rate', metavar='RATE', type=float, default=0)
+	parser.add_argument('--max-concurrency', metavar='NUM', type=int, default=None)
+	parser.add_argument('--workers', metavar='NUM', type=int, default=4)
+	options = parser.parse_args()
+	options.latency /= 1000
+
+	logger.remove()
+
+	phase_results = {}
+	command_results = {}
+	for size in options.sizes:
+		with tempfile.TemporaryDirectory() as tempdir:
+			tempdir = Path(tempdir)
+			root = tempdir / 'library'
+
+			make_tree(root, size)
+			nums = range(0, size + size // 2, 2)
+
+			phase_results[size] = run_phases(root, tempdir, nums, options)
+			command_results[size] = run_commands(root, tempdir, nums, options)
+
+	print_table('phase', PHASES, phase_results)
+	print_table('command', COMMANDS, command_results)
+
+
+if __name__ == '__main__':
+	main()
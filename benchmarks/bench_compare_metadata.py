@@ -0,0 +1,86 @@
+"""Benchmark metadata comparison against google-music-utils on a synthetic library.
+
+google-music-utils normalizes and compares the whole library once
+for missing items and again for existing items.
+"""
+
+import random
+import time
+
+import google_music_utils as gm_utils
+
+from google_music_scripts.compare import METADATA_FIELDS, compare_metadata
+
+
+def make_library(size):
+	random.seed(size)
+
+	google_songs = [
+		{
+			'artist': f'The Artist {i // 100}',
+			'album': f'Album {i // 10}',
+			'title': f'Title {i}',
+			'trackNumber': i % 10 + 1,
+		}
+		for i in range(size)
+	]
+
+	# Local tags use different formatting for a subset of the same songs.
+	local_songs = [
+		{
+			'artist': [song['artist'].upper()],
+			'album': [song['album']],
+			'title': [f"{song['title']}."],
+			'tracknumber': [f"{song['trackNumber']:02}/10"],
+		}
+		for song in random.sample(google_songs, size // 2)
+	]
+
+	return google_songs, local_songs
+
+
+def compare_metadata_gm_utils(src, dst):
+	missing = list(
+		gm_utils.find_missing_items(
+			src,
+			dst,
+			fields=METADATA_FIELDS,
+			normalize_values=True
+		)
+	)
+	existing = list(
+		gm_utils.find_existing_items(
+			src,
+			dst,
+			fields=METADATA_FIELDS,
+			normalize_values=True
+		)
+	)
+
+	return missing, existing
+
+
+def timeit(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	print(f"{'songs':>8} {'single-pass':>12} {'gm-utils':>10}")
+
+	for size in [1000, 10000, 100000]:
+		google_songs, local_songs = make_library(size)
+
+		single_time, result = timeit(compare_metadata, google_songs, local_songs)
+		gm_utils_time, gm_utils_result = timeit(compare_metadata_gm_utils, google_songs, local_songs)
+
+		assert result == gm_utils_result
+		assert len(result[1]) == size // 2
+
+		print(f'{size:>8} {single_time:>11.3f}s {gm_utils_time:>9.3f}s')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,156 @@
+"""Benchmark Google song date filtering on a synthetic library.
+
+The previous implementation converted each song's timestamp to a
+pendulum datetime for every period through chained generators.
+Results are checked against it, including timestamps on period boundaries.
+"""
+
+import random
+import time
+
+import google_music_utils as gm_utils
+import pendulum
+from tbm_utils import datetime_string_to_time_period
+
+from google_music_scripts.core import filter_google_dates
+
+CREATION_DATES = [
+	('2015', {'after': True}),
+	('2019-06', {'before': True}),
+]
+
+MODIFICATION_DATES = [
+	('2018', {'in_': True}),
+	('2018-03-14T12:30+05:30', {'after': True}),
+	('2018-11-02', {'before': True}),
+]
+
+
+def make_library(size):
+	random.seed(size)
+
+	start = pendulum.datetime(2010, 1, 1).int_timestamp
+	end = pendulum.datetime(2020, 1, 1).int_timestamp
+
+	songs = []
+	for i in range(size):
+		created = random.randint(start, end)
+		modified = random.randint(created, end)
+
+		songs.append(
+			{
+				'id': f'{i:08x}-0000-0000-0000-000000000000',
+				'creationTimestamp': str(created * 1000000 + random.randint(0, 999999)),
+				'lastModifiedTimestamp': str(modified * 1000000 + random.randint(0, 999999)),
+			}
+		)
+
+	return songs
+
+
+def boundary_songs(periods):
+	songs = []
+	for period in periods:
+		for dt in [period.start, period.end]:
+			if dt.year in [1, 9999]:
+				continue
+
+			for offset in [-1000001, -1, 0, 1, 999999, 1000000]:
+				timestamp = str(
+					dt.int_timestamp * 1000000 + dt.microsecond + offset
+				)
+
+				songs.append(
+					{
+						'id': f'boundary-{len(songs)}',
+						'creationTimestamp': timestamp,
+						'lastModifiedTimestamp': timestamp,
+					}
+				)
+
+	return songs
+
+
+def filter_google_dates_pendulum(songs, creation_dates, modification_dates):
+	matched_songs = songs
+
+	def _dt_from_gm_timestamp(gm_timestamp):
+		return pendulum.from_timestamp(gm_utils.from_gm_timestamp(gm_timestamp))
+
+	def _match_created_date(songs, period):
+		return (
+			song
+			for song in songs
+			if _dt_from_gm_timestamp(song['creationTimestamp']) in period
+		)
+
+	def _match_modified_date(songs, period):
+		return (
+			song
+			for song in songs
+			if _dt_from_gm_timestamp(song['lastModifiedTimestamp']) in period
+		)
+
+	for period in creation_dates:
+		matched_songs = _match_created_date(matched_songs, period)
+
+	for period in modification_dates:
+		matched_songs = _match_modified_date(matched_songs, period)
+
+	return list(matched_songs)
+
+
+def timeit(func, *args, **kwargs):
+	start = time.perf_counter()
+	result = func(*args, **kwargs)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	creation_dates = [
+		datetime_string_to_time_period(dt_string, **kwargs)
+		for dt_string, kwargs in CREATION_DATES
+	]
+	modification_dates = [
+		datetime_string_to_time_period(dt_string, **kwargs)
+		for dt_string, kwargs in MODIFICATION_DATES
+	]
+
+	songs = boundary_songs(creation_dates + modification_dates)
+	for periods in [creation_dates, modification_dates]:
+		for period in periods:
+			assert (
+				filter_google_dates(songs, creation_dates=[period])
+				== filter_google_dates_pendulum(songs, [period], [])
+			)
+			assert (
+				filter_google_dates(songs, modification_dates=[period])
+				== filter_google_dates_pendulum(songs, [], [period])
+			)
+
+	print(f"{'songs':>8} {'indexed':>10} {'pendulum':>10}")
+
+	for size in [1000, 10000, 100000]:
+		songs = make_library(size)
+
+		indexed_time, result = timeit(
+			filter_google_dates,
+			songs,
+			creation_dates=creation_dates,
+			modification_dates=modification_dates
+		)
+		pendulum_time, pendulum_result = timeit(
+			filter_google_dates_pendulum,
+			songs,
+			creation_dates,
+			modification_dates
+		)
+
+		assert result == pendulum_result
+
+		print(f'{size:>8} {indexed_time:>9.3f}s {pendulum_time:>9.3f}s')
+
+
+if __name__ == '__main__':
+	main()
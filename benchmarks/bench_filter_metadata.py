@@ -0,0 +1,109 @@
+"""Benchmark metadata filtering against google-music-utils on a synthetic library.
+
+The previous implementation ran google-music-utils include/exclude
+filters for each filter, re-evaluating patterns per item, and
+de-duplicated results with a list membership test.
+"""
+
+import time
+from collections import defaultdict
+
+import google_music_utils as gm_utils
+from loguru import logger
+
+from google_music_scripts.cli import parse_filter
+from google_music_scripts.core import filter_metadata
+
+FILTERS = [
+	'artist[Artist 1]+album[Album 1]-title[7]',
+	'artist[Artist 2]',
+	'-title[3]',
+	'album[Album 4]+tracknumber[^(1|2|3)$]',
+]
+
+
+def make_library(size):
+	return [
+		{
+			'id': f'{i:08x}-0000-0000-0000-000000000000',
+			'artist': f'Artist {i // 100}',
+			'album': f'Album {i // 10}',
+			'title': f'Title {i}',
+			'trackNumber': i % 10 + 1,
+		}
+		for i in range(size)
+	]
+
+
+def filter_metadata_gm_utils(songs, filters):
+	matched_songs = []
+
+	for filter_ in filters:
+		include_filters = defaultdict(list)
+		exclude_filters = defaultdict(list)
+
+		for condition in filter_:
+			if condition.oper == '+':
+				include_filters[condition.field].append(condition.pattern)
+			elif condition.oper == '-':
+				exclude_filters[condition.field].append(condition.pattern)
+
+		i_use_all = (
+			(len(include_filters) > 1)
+			or any(len(v) > 1 for v in include_filters.values())
+		)
+		matched = gm_utils.include_items(
+			songs, any_all=all if i_use_all else any, ignore_case=True, **include_filters
+		)
+
+		e_use_all = not (
+			(len(exclude_filters) > 1)
+			or any(len(v) > 1 for v in exclude_filters.values())
+		)
+		matched = gm_utils.exclude_items(
+			matched, any_all=all if e_use_all else any, ignore_case=True, **exclude_filters
+		)
+
+		for song in matched:
+			if song not in matched_songs:
+				matched_songs.append(song)
+
+	return matched_songs
+
+
+def timeit(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	logger.remove()
+
+	filters = [parse_filter(filter_) for filter_ in FILTERS]
+
+	print(f"{'songs':>8} {'compiled':>10} {'gm-utils':>10}")
+
+	for size in [1000, 5000, 10000, 100000]:
+		songs = make_library(size)
+
+		compiled_time, result = timeit(filter_metadata, songs, filters)
+
+		if size <= 10000:
+			gm_utils_time, gm_utils_result = timeit(filter_metadata_gm_utils, songs, filters)
+
+			assert (
+				sorted(song['id'] for song in result)
+				== sorted(song['id'] for song in gm_utils_result)
+			)
+
+			gm_utils = f'{gm_utils_time:>9.3f}s'
+		else:
+			gm_utils = f'{"-":>10}'
+
+		print(f'{size:>8} {compiled_time:>9.3f}s {gm_utils}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,82 @@
+"""Benchmark the download hash comparison join on a synthetic library.
+
+The join of Music Manager songs to Mobile Client client IDs was
+previously a linear search of the Music Manager songs for each
+Mobile Client song. The quadratic version is only run at small sizes.
+"""
+
+import base64
+import hashlib
+import time
+
+from google_music_scripts.compare import compare_client_ids
+
+
+def make_library(size):
+	google_songs = []
+	mc_songs = []
+	for i in range(size):
+		song_id = f'{i:08x}-0000-0000-0000-000000000000'
+		client_id = base64.b64encode(
+			hashlib.md5(song_id.encode()).digest()
+		).rstrip(b'=').decode('ascii')
+
+		google_songs.append({'id': song_id, 'title': f'Title {i}'})
+		mc_songs.append({'id': song_id, 'clientId': client_id})
+
+	# Half of the library exists locally.
+	local_client_ids = {
+		mc_song['clientId']
+		for mc_song in mc_songs[::2]
+	}
+
+	return google_songs, mc_songs, local_client_ids
+
+
+def compare_client_ids_quadratic(google_songs, mc_songs, client_ids):
+	missing_songs = []
+	existing_songs = []
+	for client_id, mc_song in {s.get('clientId'): s for s in mc_songs}.items():
+		song = next(
+			(song for song in google_songs if song.get('id') == mc_song.get('id')),
+			None
+		)
+
+		if song is not None:
+			if client_id not in client_ids:
+				missing_songs.append(song)
+			else:
+				existing_songs.append(song)
+
+	return missing_songs, existing_songs
+
+
+def timeit(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	print(f"{'songs':>8} {'indexed':>10} {'quadratic':>10}")
+
+	for size in [1000, 5000, 10000, 50000, 100000]:
+		library = make_library(size)
+		indexed_time, result = timeit(compare_client_ids, *library)
+
+		assert len(result[0]) == size // 2
+		assert len(result[1]) == size - size // 2
+
+		if size <= 5000:
+			quadratic_time, quadratic_result = timeit(compare_client_ids_quadratic, *library)
+			assert quadratic_result == result
+			quadratic = f'{quadratic_time:>9.3f}s'
+		else:
+			quadratic = f'{"-":>10}'
+
+		print(f'{size:>8} {indexed_time:>9.3f}s {quadratic}')
+
+
+if __name__ == '__main__':
+	main()
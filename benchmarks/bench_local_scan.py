@@ -0,0 +1,138 @@
+"""Benchmark the local song scan on a synthetic directory tree.
+
+The previous implementation listed files with tbm_utils.get_filepaths
+and then detected each file's format serially. Results are checked
+against it, including depth limits and exclusions.
+"""
+
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import audio_metadata
+from loguru import logger
+from tbm_utils import get_filepaths
+
+from google_music_scripts.core import get_local_songs
+
+EXCLUDES = [
+	{},
+	{'max_depth': 1},
+	{'exclude_paths': ['Artist 1']},
+	{'exclude_regexes': [r'Album 3\d']},
+	{'exclude_globs': ['*.ogg', 'Album 2/*']},
+]
+
+
+def make_tree(root, size):
+	for i in range(size):
+		dirpath = root / f'Artist {i // 100}' / f'Album {i // 10}'
+		dirpath.mkdir(parents=True, exist_ok=True)
+
+		(dirpath / f'{i:05}.flac').write_bytes(b'fLaC' + b'\x00' * 64)
+
+		if i % 10 == 0:
+			(dirpath / 'cover.jpg').write_bytes(b'\xff\xd8\xff' + b'\x00' * 64)
+			(dirpath / 'notes.ogg').write_bytes(b'\x00' * 64)
+
+	(root / 'loose.flac').write_bytes(b'fLaC' + b'\x00' * 64)
+
+
+class LatencyIndex:
+	"""Local index stand-in adding a delay to each file open like network storage."""
+
+	def __init__(self, latency):
+		self.latency = latency
+
+	def audio_format(self, filepath):
+		time.sleep(self.latency)
+
+		return audio_metadata.determine_format(filepath)
+
+	def prune(self, paths):
+		pass
+
+	def tags(self, filepath):
+		return None
+
+
+def get_local_songs_serial(
+	paths,
+	*,
+	max_depth=math.inf,
+	exclude_paths=None,
+	exclude_regexes=None,
+	exclude_globs=None
+):
+	return [
+		filepath
+		for filepath in get_filepaths(
+			paths,
+			max_depth=max_depth,
+			exclude_paths=exclude_paths,
+			exclude_regexes=exclude_regexes,
+			exclude_globs=exclude_globs
+		)
+		if audio_metadata.determine_format(filepath) in [
+			audio_metadata.FLAC,
+			audio_metadata.MP3,
+			audio_metadata.OggOpus,
+			audio_metadata.OggVorbis,
+			audio_metadata.WAVE,
+		]
+	]
+
+
+def timeit(func, *args, **kwargs):
+	start = time.perf_counter()
+	result = func(*args, **kwargs)
+
+	return time.perf_counter() - start, result
+
+
+def main():
+	logger.remove()
+
+	with tempfile.TemporaryDirectory() as tempdir:
+		root = Path(tempdir).resolve()
+		make_tree(root, 1000)
+
+		for kwargs in EXCLUDES:
+			assert (
+				get_local_songs([root], **kwargs)
+				== sorted(get_local_songs_serial([root], **kwargs))
+			)
+
+	print(
+		f"{'files':>8} {'serial':>10} {'1 worker':>10} {'8 workers':>10} "
+		f"{'1 worker 1ms':>13} {'8 workers 1ms':>14}"
+	)
+
+	for size in [1000, 10000]:
+		with tempfile.TemporaryDirectory() as tempdir:
+			root = Path(tempdir).resolve()
+			make_tree(root, size)
+
+			serial_time, serial_result = timeit(get_local_songs_serial, [root])
+			single_time, single_result = timeit(get_local_songs, [root], workers=1)
+			threaded_time, threaded_result = timeit(get_local_songs, [root], workers=8)
+
+			assert single_result == threaded_result == sorted(serial_result)
+
+			latency_index = LatencyIndex(0.001)
+			single_latency_time, _ = timeit(
+				get_local_songs, [root], local_index=latency_index, workers=1
+			)
+			threaded_latency_time, _ = timeit(
+				get_local_songs, [root], local_index=latency_index, workers=8
+			)
+
+			print(
+				f'{size:>8} {serial_time:>9.3f}s {single_time:>9.3f}s {threaded_time:>9.3f}s '
+				f'{single_latency_time:>12.3f}s {threaded_latency_time:>13.3f}s'
+			)
+
+
+if __name__ == '__main__':
+	main()
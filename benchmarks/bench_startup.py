@@ -0,0 +1,108 @@
+"""Benchmark CLI startup time against a budget.
+
+Parsing arguments and printing help shouldn't import the Google Music
+clients or audio libraries; only running a command that needs them should.
+Fails if any heavy module is imported at startup or the median time
+of ``gms --help`` exceeds the budget.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Median wall time budget for ``gms --help`` in seconds.
+STARTUP_BUDGET = 0.3
+
+# pendulum isn't listed: tbm_utils, which provides the CLI's argument parsers
+# and date filter parsing, imports it from its package __init__, so it can't
+# be deferred without replacing tbm_utils.
+HEAVY_MODULES = [
+	'audio_metadata',
+	'google_music',
+	'google_music_proto',
+	'google_music_utils',
+	'natsort',
+]
+
+RUNS = 10
+
+
+def run_python(*args):
+	env = {**os.environ, 'PYTHONWARNINGS': 'ignore'}
+
+	return subprocess.run(
+		[sys.executable, *args],
+		stdout=subprocess.PIPE,
+		stderr=subprocess.PIPE,
+		env=env,
+		universal_newlines=True,
+	)
+
+
+def import_times():
+	"""Parse ``-X importtime`` output into self time in microseconds per module."""
+
+	result = run_python('-X', 'importtime', '-c', 'import google_music_scripts.cli')
+
+	times = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:'):
+			continue
+
+		self_us, _, name = line[len('import time:'):].split('|')
+
+		if self_us.strip().isdigit():
+			times[name.strip()] = int(self_us)
+
+	return times
+
+
+def main():
+	result = run_python(
+		'-c',
+		'import sys, google_music_scripts.cli; print(" ".join(sys.modules))'
+	)
+	imported = set(result.stdout.split())
+
+	heavy_imported = [
+		module
+		for module in HEAVY_MODULES
+		if module in imported
+	]
+	assert not heavy_imported, f"Imported at startup: {', '.join(heavy_imported)}"
+
+	times = []
+	for _ in range(RUNS):
+		start = time.perf_counter()
+		result = run_python('-m', 'google_music_scripts', '--help')
+		times.append(time.perf_counter() - start)
+
+		assert result.returncode == 0, result.stderr
+
+	baseline = []
+	for _ in range(RUNS):
+		start = time.perf_counter()
+		run_python('-c', 'pass')
+		baseline.append(time.perf_counter() - start)
+
+	print("Slowest imports of google_music_scripts.cli:")
+	for name, self_us in sorted(
+		import_times().items(),
+		key=lambda item: item[1],
+		reverse=True
+	)[:10]:
+		print(f'{self_us / 1000:>10.1f}ms {name}')
+
+	median = statistics.median(times)
+	print()
+	print(f"{'interpreter':>12} {statistics.median(baseline):>9.3f}s")
+	print(f"{'gms --help':>12} {median:>9.3f}s")
+	print(f"{'budget':>12} {STARTUP_BUDGET:>9.3f}s")
+
+	assert median <= STARTUP_BUDGET, f"Startup time {median:.3f}s exceeds budget"
+
+
+if __name__ == '__main__':
+	main()
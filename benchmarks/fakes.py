@@ -0,0 +1,316 @@
+"""In-process fake Music Manager and Mobile Client for benchmarks.
+
+The fakes implement the parts of google-music clients used by
+google-music-scripts with configurable library size, latency per
+request, and failure injection. Libraries are built from synthetic
+song numbers so they can match a synthetic local library.
+"""
+
+import contextlib
+import random
+import threading
+import time
+from pathlib import Path
+
+import google_music_proto.mobileclient.calls as mc_calls
+import google_music_proto.musicmanager.calls as mm_calls
+
+from synthetic import client_id, mp3_bytes, song_tags
+
+UPLOADER_ID = '00:11:22:33:AA:BB'
+
+
+def song_id(num):
+	return f'{num:08x}-0000-0000-0000-000000000000'
+
+
+def song_num(id_):
+	return int(id_.split('-', 1)[0], 16)
+
+
+def _timestamp(num):
+	# Spread songs over 2015-2019 in microseconds.
+	return str((1420070400 + num * 1571) * 1000000)
+
+
+def mobileclient_song(num, *, flac_ratio=0.2):
+	tags = song_tags(num)
+
+	return {
+		'id': song_id(num),
+		'clientId': client_id(num, flac_ratio=flac_ratio),
+		'title': tags['title'],
+		'artist': tags['artist'],
+		'album': tags['album'],
+		'trackNumber': int(tags['tracknumber']),
+		'creationTimestamp': _timestamp(num),
+		'lastModifiedTimestamp': _timestamp(num),
+		'durationMillis': '180000',
+		'deleted': False,
+	}
+
+
+def musicmanager_song(num):
+	tags = song_tags(num)
+
+	return {
+		'id': song_id(num),
+		'title': tags['title'],
+		'artist': tags['artist'],
+		'album': tags['album'],
+		'track_number': int(tags['tracknumber']),
+		'track_size': len(mp3_bytes(num)),
+	}
+
+
+class _ErrorResponse:
+	def __init__(self, status_code):
+		self.status_code = status_code
+		self.headers = {}
+
+
+class FakeError(Exception):
+	"""Fake HTTP error with a ``response`` like httpx errors."""
+
+	def __init__(self, status_code=503, reason='Service Unavailable'):
+		super().__init__(f"{status_code} {reason}")
+
+		self.response = _ErrorResponse(status_code)
+
+
+class _Response:
+	def __init__(self, body):
+		self.body = body
+
+
+class _Field:
+	def __init__(self, name):
+		self.name = name
+
+
+class _TrackInfo:
+	def __init__(self, song):
+		self._song = song
+
+	def ListFields(self):
+		return [
+			(_Field(name), value)
+			for name, value in self._song.items()
+		]
+
+
+class _ExportIDsBody:
+	def __init__(self, songs):
+		self.download_track_info = [_TrackInfo(song) for song in songs]
+		self.continuation_token = ''
+
+
+class _StreamResponse:
+	def __init__(self, data, error=None):
+		self._data = data
+		self._error = error
+
+	def raise_for_status(self):
+		if self._error is not None:
+			raise self._error
+
+	def iter_bytes(self):
+		for i in range(0, len(self._data), 65536):
+			yield self._data[i:i + 65536]
+
+
+class _Session:
+	def __init__(self, client):
+		self._client = client
+		self.oauth_client = self
+		self.params = {}
+
+	def add_token(self, url, http_method=None, headers=None):
+		return url, headers, None
+
+	def refresh_token(self):
+		pass
+
+	@contextlib.contextmanager
+	def stream(self, method, url, *, headers=None, params=None, allow_redirects=True):
+		throttled = self._client._request()
+
+		num = song_num(params['songid'])
+		error = self._client._error(throttled)
+
+		yield _StreamResponse(mp3_bytes(num), error)
+
+
+class _FakeClient:
+	def __init__(
+		self,
+		nums,
+		*,
+		latency=0,
+		failure_rate=0,
+		max_concurrency=None,
+		seed=0,
+		flac_ratio=0.2
+	):
+		self.is_authenticated = True
+		self.latency = latency
+		self.failure_rate = failure_rate
+		self.max_concurrency = max_concurrency
+		self.flac_ratio = flac_ratio
+		self.requests = 0
+		self.throttled = 0
+		self._active = 0
+
+		self._random = random.Random(seed)
+		self._lock = threading.Lock()
+		self._nums = set(nums)
+		self._modified = {}
+
+	def _request(self):
+		"""Simulate a request, returning ``True`` if it exceeded ``max_concurrency``."""
+
+		with self._lock:
+			self.requests += 1
+			self._active += 1
+			throttled = (
+				self.max_concurrency is not None
+				and self._active > self.max_concurrency
+			)
+
+			if throttled:
+				self.throttled += 1
+
+		try:
+			if self.latency:
+				time.sleep(self.latency)
+		finally:
+			with self._lock:
+				self._active -= 1
+
+		return throttled
+
+	def _error(self, throttled=False):
+		if throttled:
+			return FakeError(429, 'Too Many Requests')
+
+		if self._should_fail():
+			return FakeError()
+
+		return None
+
+	def _should_fail(self):
+		if not self.failure_rate:
+			return False
+
+		with self._lock:
+			return self._random.random() < self.failure_rate
+
+	def _touch(self, num):
+		self._modified[num] = int(time.time() * 1000000)
+
+
+class FakeMobileClient(_FakeClient):
+	"""Fake :class:`google_music.MobileClient`."""
+
+	client = 'mobileclient'
+
+	def _song(self, num):
+		song = mobileclient_song(num, flac_ratio=self.flac_ratio)
+
+		if num in self._modified:
+			song['lastModifiedTimestamp'] = str(self._modified[num])
+
+		return song
+
+	def songs(self):
+		self._request()
+
+		return [self._song(num) for num in sorted(self._nums)]
+
+	def songs_delete(self, songs):
+		error = self._error(self._request())
+		if error is not None:
+			raise error
+
+		success_ids = []
+		for song in songs:
+			if not self._should_fail():
+				with self._lock:
+					self._nums.discard(song_num(song['id']))
+
+				success_ids.append(song['id'])
+
+		return success_ids
+
+	def _call(self, call, *args, updated_min=None, **kwargs):
+		if call is not mc_calls.TrackFeed:
+			raise NotImplementedError(call)
+
+		self._request()
+
+		items = [
+			song
+			for song in (self._song(num) for num in sorted(self._nums))
+			if updated_min is None or int(song['lastModifiedTimestamp']) > updated_min
+		]
+
+		return _Response({'data': {'items': items}})
+
+
+class FakeMusicManager(_FakeClient):
+	"""Fake :class:`google_music.MusicManager`."""
+
+	client = 'musicmanager'
+	uploader_id = UPLOADER_ID
+
+	def __init__(self, nums, **kwargs):
+		super().__init__(nums, **kwargs)
+
+		self._session = _Session(self)
+		self._next_num = max(self._nums, default=-1) + 1
+
+	def songs(self):
+		self._request()
+
+		return [musicmanager_song(num) for num in sorted(self._nums)]
+
+	def quota(self):
+		self._request()
+
+		return len(self._nums), 50000
+
+	def upload(self, song, album_art_path=None, no_sample=False):
+		error = self._error(self._request())
+		if error is not None:
+			return {
+				'filepath': Path(getattr(song, 'filepath', song)),
+				'success': False,
+				'reason': error,
+			}
+
+		with self._lock:
+			num = self._next_num
+			self._next_num += 1
+			self._nums.add(num)
+			self._touch(num)
+
+		return {
+			'filepath': Path(getattr(song, 'filepath', song)),
+			'success': True,
+			'reason': 'Uploaded',
+			'song_id': song_id(num),
+		}
+
+	def _call(self, call, *args, updated_min=None, **kwargs):
+		if call is not mm_calls.ExportIDs:
+			raise NotImplementedError(call)
+
+		self._request()
+
+		songs = [
+			musicmanager_song(num)
+			for num in sorted(self._nums)
+			if updated_min is None or self._modified.get(num, 0) > updated_min
+		]
+
+		return _Response(_ExportIDsBody(songs))
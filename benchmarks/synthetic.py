@@ -0,0 +1,151 @@
+"""Synthetic tagged MP3 and FLAC libraries for benchmarks.
+
+Files are minimal but valid enough for audio-metadata to detect,
+load tags from, and generate client IDs for. Each song's tags and
+client ID are derived from its number, so fake Google libraries can
+be built to match a synthetic local library without reading it.
+"""
+
+import base64
+import hashlib
+import struct
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz frame header.
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x64'
+MP3_FRAME_SIZE = 417
+
+FLAC_SAMPLE_RATE = 44100
+FLAC_SAMPLES = FLAC_SAMPLE_RATE * 180
+
+
+def song_tags(num):
+	"""Get the tags of synthetic song ``num``."""
+
+	return {
+		'artist': f'Artist {num // 100}',
+		'album': f'Album {num // 10}',
+		'title': f'Title {num}',
+		'tracknumber': str(num % 10 + 1),
+	}
+
+
+def song_format(num, *, flac_ratio=0.2):
+	"""Get the format of synthetic song ``num``, ``'flac'`` or ``'mp3'``."""
+
+	if flac_ratio and num % round(1 / flac_ratio) == 0:
+		return 'flac'
+
+	return 'mp3'
+
+
+def _synchsafe(size):
+	return bytes(
+		(size >> shift) & 0x7f
+		for shift in [21, 14, 7, 0]
+	)
+
+
+def _mp3_audio(num, num_frames):
+	frame = MP3_FRAME_HEADER + num.to_bytes(4, 'big') * ((MP3_FRAME_SIZE - 4) // 4)
+
+	return frame.ljust(MP3_FRAME_SIZE, b'\x00') * num_frames
+
+
+def _flac_md5(num):
+	return hashlib.md5(num.to_bytes(8, 'big')).digest()
+
+
+def mp3_bytes(num, *, tags=None, num_frames=8):
+	"""Create an ID3v2.3 tagged MP3 for synthetic song ``num``."""
+
+	if tags is None:
+		tags = song_tags(num)
+
+	frame_ids = {
+		'album': b'TALB',
+		'artist': b'TPE1',
+		'title': b'TIT2',
+		'tracknumber': b'TRCK',
+	}
+
+	frames = b''
+	for field, value in tags.items():
+		data = b'\x00' + value.encode('latin-1')
+		frames += frame_ids[field] + struct.pack('>I', len(data)) + b'\x00\x00' + data
+
+	header = b'ID3\x03\x00\x00' + _synchsafe(len(frames))
+
+	return header + frames + _mp3_audio(num, num_frames)
+
+
+def flac_bytes(num, *, tags=None):
+	"""Create a Vorbis comment tagged FLAC for synthetic song ``num``."""
+
+	if tags is None:
+		tags = song_tags(num)
+
+	streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00\x00\x00\x00\x00\x00'
+	streaminfo += (
+		(FLAC_SAMPLE_RATE << 44)
+		| (1 << 41)  # 2 channels.
+		| (15 << 36)  # 16 bits per sample.
+		| FLAC_SAMPLES
+	).to_bytes(8, 'big')
+	streaminfo += _flac_md5(num)
+
+	vendor = b'synthetic'
+	comments = [
+		f'{field.upper()}={value}'.encode('utf-8')
+		for field, value in tags.items()
+	]
+	vorbis_comment = struct.pack('<I', len(vendor)) + vendor
+	vorbis_comment += struct.pack('<I', len(comments))
+	for comment in comments:
+		vorbis_comment += struct.pack('<I', len(comment)) + comment
+
+	return (
+		b'fLaC'
+		+ b'\x00' + len(streaminfo).to_bytes(3, 'big') + streaminfo
+		+ b'\x84' + len(vorbis_comment).to_bytes(3, 'big') + vorbis_comment
+		# Stand-in for audio frames.
+		+ b'\xff\xf8' + b'\x00' * 256
+	)
+
+
+def client_id(num, *, flac_ratio=0.2):
+	"""Get the Google Music client ID of synthetic song ``num``."""
+
+	if song_format(num, flac_ratio=flac_ratio) == 'flac':
+		digest = _flac_md5(num)
+	else:
+		digest = hashlib.md5(_mp3_audio(num, 8)).digest()
+
+	return base64.b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def make_tree(root, size, *, flac_ratio=0.2):
+	"""Create a synthetic library of ``size`` songs in Artist/Album directories.
+
+	Returns:
+		list: Filepaths of the created songs, ordered by song number.
+	"""
+
+	filepaths = []
+	for num in range(size):
+		tags = song_tags(num)
+		dirpath = root / tags['artist'] / tags['album']
+
+		if num % 10 == 0:
+			dirpath.mkdir(parents=True, exist_ok=True)
+			(dirpath / 'cover.jpg').write_bytes(b'\xff\xd8\xff\xe0' + b'\x00' * 60)
+
+		if song_format(num, flac_ratio=flac_ratio) == 'flac':
+			filepath = dirpath / f'{num:06} - {tags["title"]}.flac'
+			filepath.write_bytes(flac_bytes(num, tags=tags))
+		else:
+			filepath = dirpath / f'{num:06} - {tags["title"]}.mp3'
+			filepath.write_bytes(mp3_bytes(num, tags=tags))
+
+		filepaths.append(filepath)
+
+	return filepaths
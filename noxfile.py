@@ -1,4 +1,5 @@
 import shutil
+from pathlib import Path
 
 import nox
 
@@ -26,3 +27,11 @@ def doc(session):
 		'.',
 		'_build/html'
 	)
+
+
+@nox.session
+def benchmark(session):
+	session.install('-U', '.')
+
+	for benchmark in sorted(Path('benchmarks').glob('bench_*.py')):
+		session.run('python', str(benchmark))
@@ -0,0 +1,138 @@
+__all__ = [
+	'EmbeddedArtCache',
+]
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+import audio_metadata
+from google_music_proto.musicmanager.utils import get_album_art
+from loguru import logger
+
+from .config import ensure_data_dir
+from .phases import increment
+
+ALBUM_ART_DIRNAME = 'album-art'
+
+# Maximum width and height of downscaled album art in pixels.
+DEFAULT_ART_SIZE = 500
+
+
+class EmbeddedArtCache:
+	"""Downscaled copies of embedded album art, stored by content.
+
+	The picture Google Music would use is extracted from a song,
+	downscaled to fit ``max_size`` and saved as a JPEG named after
+	the hash of the original. Each unique picture is converted once
+	and reused by later songs and runs.
+
+	Requires Pillow, installed with the ``art`` extra.
+
+	Parameters:
+		username (str, Optional): Used to keep separate caches per user.
+		dirpath (str, os.PathLike, Optional): Location of the cache.
+			Default: ``album-art`` in the user data directory.
+		max_size (int, Optional): Maximum width and height in pixels.
+		quality (int, Optional): JPEG quality of downscaled pictures.
+
+	Raises:
+		ImportError: If Pillow isn't installed.
+	"""
+
+	def __init__(self, username=None, *, dirpath=None, max_size=DEFAULT_ART_SIZE, quality=85):
+		# Imported here so commands not using embedded art don't load Pillow.
+		try:
+			from PIL import Image
+		except ImportError:
+			raise ImportError(
+				"Pillow is required to downscale embedded album art: "
+				"pip install google-music-scripts[art]"
+			) from None
+
+		self._image = Image
+
+		if dirpath is None:
+			dirpath = ensure_data_dir(username=username) / ALBUM_ART_DIRNAME
+
+		dirpath.mkdir(parents=True, exist_ok=True)
+
+		self.dirpath = dirpath
+		self.max_size = max_size
+		self.quality = quality
+
+		self._paths = {}
+		self._locks = {}
+		self._lock = threading.Lock()
+
+	def _downscale(self, data, filepath):
+		Image = self._image
+
+		with Image.open(io.BytesIO(data)) as image:
+			if (
+				image.format == 'JPEG'
+				and max(image.size) <= self.max_size
+			):
+				art = data
+			else:
+				image.thumbnail((self.max_size, self.max_size), Image.LANCZOS)
+
+				output = io.BytesIO()
+				image.convert('RGB').save(output, 'JPEG', quality=self.quality, optimize=True)
+				art = output.getvalue()
+
+		# Write to a temporary file and move it into place
+		# so concurrent uploads never see a partial image.
+		with tempfile.NamedTemporaryFile(dir=self.dirpath, suffix='.part', delete=False) as f:
+			f.write(art)
+
+		os.replace(f.name, filepath)
+
+		increment('album_art_downscaled')
+		logger.debug(
+			"Downscaled album art from {} to {} bytes",
+			len(data),
+			len(art)
+		)
+
+	def get(self, song):
+		"""Get the downscaled embedded album art of a song.
+
+		Parameters:
+			song (os.PathLike or audio_metadata.Format): A song.
+
+		Returns:
+			Path: The downscaled picture,
+			``None`` if the song has none or it couldn't be converted.
+		"""
+
+		try:
+			data = get_album_art(song)
+		except (audio_metadata.AudioMetadataException, OSError):
+			return None
+
+		if not data:
+			return None
+
+		digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+		# Songs sharing a picture wait for the first to convert it.
+		with self._lock:
+			lock = self._locks.setdefault(digest, threading.Lock())
+
+		with lock:
+			if digest not in self._paths:
+				filepath = self.dirpath / f'{digest}-{self.max_size}.jpg'
+
+				if not filepath.is_file():
+					try:
+						self._downscale(data, filepath)
+					except (OSError, ValueError, self._image.DecompressionBombError) as e:
+						logger.debug("Failed to downscale album art: {}", e)
+						filepath = None
+
+				self._paths[digest] = filepath
+
+			return self._paths[digest]
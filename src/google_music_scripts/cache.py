@@ -0,0 +1,586 @@
+__all__ = [
+	'LibrarySnapshot',
+	'LocalIndex',
+]
+
+import contextlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import audio_metadata
+import google_music_proto.mobileclient.calls as mc_calls
+import google_music_proto.musicmanager.calls as mm_calls
+from google_music_proto.musicmanager.utils import generate_client_id
+from loguru import logger
+
+from .config import ensure_data_dir
+from .engine import raise_if_cancelled
+from .phases import count
+
+LOCAL_INDEX_FILENAME = 'local-index.sqlite'
+LOCAL_INDEX_SCHEMA = """
+	CREATE TABLE IF NOT EXISTS songs (
+		filepath TEXT PRIMARY KEY,
+		size INTEGER NOT NULL,
+		mtime INTEGER NOT NULL,
+		inode INTEGER NOT NULL,
+		format TEXT,
+		tags TEXT,
+		client_id TEXT
+	)
+"""
+
+LIBRARY_SNAPSHOT_FILENAME = 'library-snapshot.sqlite'
+LIBRARY_SNAPSHOT_SCHEMA = """
+	CREATE TABLE IF NOT EXISTS snapshots (
+		client TEXT PRIMARY KEY,
+		updated_min INTEGER NOT NULL,
+		refreshed INTEGER NOT NULL
+	);
+	CREATE TABLE IF NOT EXISTS songs (
+		client TEXT NOT NULL,
+		id TEXT NOT NULL,
+		song TEXT NOT NULL,
+		PRIMARY KEY (client, id)
+	);
+	CREATE INDEX IF NOT EXISTS songs_id ON songs (id);
+"""
+
+FORMATS = {
+	format_.__name__: format_
+	for format_ in [
+		audio_metadata.FLAC,
+		audio_metadata.MP3,
+		audio_metadata.OggOpus,
+		audio_metadata.OggVorbis,
+		audio_metadata.WAVE,
+	]
+}
+
+# Entry list positions.
+_SIZE, _MTIME, _INODE, _FORMAT, _TAGS, _CLIENT_ID = range(6)
+
+
+def _process_context():
+	"""Get a multiprocessing context that doesn't fork the calling process.
+
+	The fork server is started once with the hashing code imported,
+	so workers forked from it start quickly. Spawned workers are used
+	where there's no fork server, e.g. Windows.
+	"""
+
+	if 'forkserver' not in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context('spawn')
+
+	context = multiprocessing.get_context('forkserver')
+	context.set_forkserver_preload(['google_music_proto.musicmanager.utils'])
+
+	return context
+
+
+class LocalIndex:
+	"""Persistent index of local audio file information.
+
+	Entries are keyed by filepath and validated against the file's
+	size, modification time, and inode. Unchanged files are served
+	from the index; new or modified files are read and re-indexed.
+
+	Parameters:
+		username (str, Optional): Used to keep a separate index per user.
+		filepath (str, os.PathLike, Optional):
+			Location of the index database.
+			Default: ``local-index.sqlite`` in the user data directory.
+	"""
+
+	def __init__(self, username=None, *, filepath=None):
+		if filepath is None:
+			filepath = ensure_data_dir(username=username) / LOCAL_INDEX_FILENAME
+
+		self.filepath = filepath
+
+		self._conn = None
+		self._entries = {
+			row[0]: list(row[1:])
+			for row in self._connection().execute(
+				"SELECT filepath, size, mtime, inode, format, tags, client_id FROM songs"
+			)
+		}
+		self._dirty = set()
+		self._seen = set()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _connection(self):
+		if self._conn is None:
+			# Used from one thread at a time, not always the one that opened it.
+			self._conn = sqlite3.connect(str(self.filepath), check_same_thread=False)
+			self._conn.execute(LOCAL_INDEX_SCHEMA)
+
+		return self._conn
+
+	def _entry(self, filepath):
+		key = str(filepath)
+		stat = os.stat(key)
+		entry = self._entries.get(key)
+
+		if (
+			entry is None
+			or entry[_SIZE] != stat.st_size
+			or entry[_MTIME] != stat.st_mtime_ns
+			or entry[_INODE] != stat.st_ino
+		):
+			entry = [stat.st_size, stat.st_mtime_ns, stat.st_ino, None, None, None]
+			self._entries[key] = entry
+			self._dirty.add(key)
+
+		self._seen.add(key)
+
+		return key, entry
+
+	def client_id(self, filepath):
+		"""Get the Google Music client ID of a local song."""
+
+		key, entry = self._entry(filepath)
+
+		if entry[_CLIENT_ID] is None:
+			entry[_CLIENT_ID] = generate_client_id(filepath)
+			self._dirty.add(key)
+
+		return entry[_CLIENT_ID]
+
+	def cached_client_id(self, filepath):
+		"""Get the client ID of a local song only if it's already in the index.
+
+		Unlike :meth:`client_id`, songs are never hashed.
+		``None`` is returned for songs not indexed or changed since.
+		"""
+
+		key = str(filepath)
+		entry = self._entries.get(key)
+
+		if entry is None:
+			return None
+
+		try:
+			stat = os.stat(key)
+		except OSError:
+			return None
+
+		if (
+			entry[_SIZE] != stat.st_size
+			or entry[_MTIME] != stat.st_mtime_ns
+			or entry[_INODE] != stat.st_ino
+		):
+			return None
+
+		return entry[_CLIENT_ID]
+
+	def client_ids(self, filepaths, *, workers=None):
+		"""Generate the Google Music client IDs of local songs.
+
+		Client IDs already in the index are yielded first. The rest are
+		generated in a process pool and yielded as they are completed.
+
+		Parameters:
+			filepaths (list): Local song filepaths.
+			workers (int, Optional): Number of processes generating client IDs.
+				Default: Number of CPUs
+
+		Yields:
+			tuple: ``(filepath, client_id)`` for each filepath.
+		"""
+
+		uncached = []
+		for filepath in filepaths:
+			raise_if_cancelled()
+
+			key, entry = self._entry(filepath)
+
+			if entry[_CLIENT_ID] is None:
+				uncached.append((filepath, key, entry))
+			else:
+				count(items=1)
+
+				yield filepath, entry[_CLIENT_ID]
+
+		if not uncached:
+			return
+
+		if workers is None:
+			workers = os.cpu_count() or 1
+
+		workers = min(workers, len(uncached))
+
+		with contextlib.ExitStack() as stack:
+			if workers > 1:
+				# Forking while other threads hold locks, e.g. library listings
+				# running concurrently, can deadlock the workers.
+				pool_kwargs = {}
+				if sys.version_info >= (3, 7):
+					pool_kwargs['mp_context'] = _process_context()
+
+				executor = stack.enter_context(
+					ProcessPoolExecutor(max_workers=workers, **pool_kwargs)
+				)
+
+				# Chunk tasks to amortize IPC while keeping results streaming.
+				client_ids = executor.map(
+					generate_client_id,
+					[filepath for filepath, _, _ in uncached],
+					chunksize=max(1, min(32, len(uncached) // (workers * 4)))
+				)
+
+				# Closing the results cancels pending tasks
+				# so the pool doesn't finish them when stopped early.
+				stack.callback(client_ids.close)
+			else:
+				client_ids = map(
+					generate_client_id,
+					[filepath for filepath, _, _ in uncached]
+				)
+
+			for (filepath, key, entry), client_id in zip(uncached, client_ids):
+				raise_if_cancelled()
+
+				entry[_CLIENT_ID] = client_id
+				self._dirty.add(key)
+				count(items=1, num_bytes=entry[_SIZE])
+
+				yield filepath, client_id
+
+	def audio_format(self, filepath):
+		"""Get the audio format class of a local file, ``None`` if unsupported."""
+
+		key, entry = self._entry(filepath)
+
+		if entry[_FORMAT] is None:
+			format_ = audio_metadata.determine_format(filepath)
+			entry[_FORMAT] = format_.__name__ if format_ is not None else ''
+			self._dirty.add(key)
+
+		return FORMATS.get(entry[_FORMAT])
+
+	def tags(self, filepath):
+		"""Get the tags of a local song as a dict, ``None`` if they can't be loaded."""
+
+		key, entry = self._entry(filepath)
+
+		if entry[_TAGS] is None:
+			try:
+				tags = dict(audio_metadata.load(filepath).tags)
+			except audio_metadata.AudioMetadataException:
+				tags = None
+
+			entry[_TAGS] = json.dumps(tags, default=str)
+			self._dirty.add(key)
+
+		return json.loads(entry[_TAGS])
+
+	def prune(self, paths):
+		"""Remove entries under ``paths`` of files that no longer exist.
+
+		Only entries that weren't accessed since loading or closing are checked,
+		so files skipped by exclusions or depth limits keep their entries.
+		"""
+
+		roots = {str(path) for path in paths}
+		prefixes = tuple(os.path.join(root, '') for root in roots)
+
+		stale = [
+			key
+			for key in self._entries
+			if (
+				key not in self._seen
+				and (
+					key in roots
+					or key.startswith(prefixes)
+				)
+				and not os.path.exists(key)
+			)
+		]
+
+		for key in stale:
+			del self._entries[key]
+			self._dirty.add(key)
+
+	def save(self):
+		conn = self._connection()
+
+		with conn:
+			conn.executemany(
+				"DELETE FROM songs WHERE filepath = ?",
+				(
+					(key,)
+					for key in self._dirty
+					if key not in self._entries
+				)
+			)
+			conn.executemany(
+				"INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?)",
+				(
+					(key, *self._entries[key])
+					for key in self._dirty
+					if key in self._entries
+				)
+			)
+
+		self._dirty.clear()
+
+	def close(self):
+		"""Save the index and close its database.
+
+		The index can still be used afterwards;
+		the database is reopened when it's saved again.
+		"""
+
+		self.save()
+		self._conn.close()
+		self._conn = None
+		self._seen.clear()
+
+
+def _timestamp_now():
+	return int(time.time() * 1000000)
+
+
+def _iter_mobileclient_changes(mc, updated_min):
+	start_token = None
+
+	while True:
+		raise_if_cancelled()
+
+		response = mc._call(
+			mc_calls.TrackFeed,
+			max_results=49995,
+			start_token=start_token,
+			updated_min=updated_min
+		)
+
+		yield from response.body.get('data', {}).get('items', [])
+
+		start_token = response.body.get('nextPageToken')
+		if start_token is None:
+			break
+
+
+def _iter_musicmanager_changes(mm, updated_min):
+	continuation_token = None
+
+	while True:
+		raise_if_cancelled()
+
+		response = mm._call(
+			mm_calls.ExportIDs,
+			mm.uploader_id,
+			continuation_token=continuation_token,
+			export_type=1,
+			updated_min=updated_min
+		)
+
+		for track_info in response.body.download_track_info:
+			yield {
+				field.name: value
+				for field, value in track_info.ListFields()
+			}
+
+		continuation_token = response.body.continuation_token
+		if not continuation_token:
+			break
+
+
+class LibrarySnapshot:
+	"""Persistent snapshot of Google Music library listings.
+
+	A snapshot is kept for each client type. After the initial full
+	listing, only songs changed since the last seen modification time
+	are fetched. A full listing is fetched when ``refresh`` is ``True``
+	or the snapshot is older than ``ttl``.
+
+	Note:
+		Music Manager listings don't report deleted songs.
+		Songs deleted by gms are removed from the snapshots directly;
+		other deletions are picked up by the next full refresh.
+
+	Parameters:
+		username (str, Optional): Used to keep a separate snapshot per user.
+		filepath (str, os.PathLike, Optional):
+			Location of the snapshot database.
+			Default: ``library-snapshot.sqlite`` in the user data directory.
+		refresh (bool, Optional): Fetch full listings instead of changes.
+			Default: ``False``
+		ttl (int, Optional): Seconds before a full listing is fetched again.
+			Default: ``86400``
+	"""
+
+	def __init__(self, username=None, *, filepath=None, refresh=False, ttl=86400):
+		if filepath is None:
+			filepath = ensure_data_dir(username=username) / LIBRARY_SNAPSHOT_FILENAME
+
+		self.filepath = filepath
+		self.refresh = refresh
+		self.ttl = ttl
+
+		self._conn = None
+		self._songs = {}
+		self._refreshed = set()
+
+		# Clients can be listed concurrently; their fetches run unlocked.
+		self._lock = threading.RLock()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _connection(self):
+		if self._conn is None:
+			self._conn = sqlite3.connect(str(self.filepath), check_same_thread=False)
+			self._conn.executescript(LIBRARY_SNAPSHOT_SCHEMA)
+
+		return self._conn
+
+	def _load(self, client_name):
+		return {
+			song_id: json.loads(song)
+			for song_id, song in self._connection().execute(
+				"SELECT id, song FROM songs WHERE client = ?",
+				(client_name,)
+			)
+		}
+
+	def _fetch_changes(self, client, updated_min):
+		if client.client == 'mobileclient':
+			return _iter_mobileclient_changes(client, updated_min)
+		else:
+			return _iter_musicmanager_changes(client, updated_min)
+
+	def songs(self, client):
+		"""Get the song listing of a client, fetching changes as needed.
+
+		Listings are kept in memory, so later calls only fetch changes.
+		"""
+
+		client_name = client.client
+
+		with self._lock:
+			now = _timestamp_now()
+			row = self._connection().execute(
+				"SELECT updated_min, refreshed FROM snapshots WHERE client = ?",
+				(client_name,)
+			).fetchone()
+
+			full = (
+				(self.refresh and client_name not in self._refreshed)
+				or row is None
+				or now - row[1] > self.ttl * 1000000
+			)
+
+			if full:
+				songs = {}
+				updated_min = -1
+				refreshed = now
+			else:
+				if client_name in self._songs:
+					songs = self._songs[client_name]
+				else:
+					songs = self._load(client_name)
+
+				updated_min, refreshed = row
+
+		if full:
+			logger.debug("Fetching full library listing with {}", client.__class__.__name__)
+
+			changes = client.songs()
+		else:
+			logger.debug("Fetching library changes with {}", client.__class__.__name__)
+
+			changes = list(self._fetch_changes(client, updated_min))
+
+		raise_if_cancelled()
+
+		changed = {}
+		for song in changes:
+			if song.get('deleted'):
+				songs.pop(song['id'], None)
+				changed[song['id']] = None
+			else:
+				songs[song['id']] = song
+				changed[song['id']] = song
+
+			updated_min = max(updated_min, int(song.get('lastModifiedTimestamp', -1)))
+
+		# Music Manager songs don't have modification times.
+		if client_name == 'musicmanager':
+			updated_min = now
+
+		with self._lock, self._connection() as conn:
+			if refreshed == now:
+				self._refreshed.add(client_name)
+				conn.execute("DELETE FROM songs WHERE client = ?", (client_name,))
+
+			conn.executemany(
+				"DELETE FROM songs WHERE client = ? AND id = ?",
+				(
+					(client_name, song_id)
+					for song_id, song in changed.items()
+					if song is None
+				)
+			)
+			conn.executemany(
+				"INSERT OR REPLACE INTO songs VALUES (?, ?, ?)",
+				(
+					(client_name, song_id, json.dumps(song))
+					for song_id, song in changed.items()
+					if song is not None
+				)
+			)
+			conn.execute(
+				"INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+				(client_name, updated_min, refreshed)
+			)
+
+			self._songs[client_name] = songs
+
+		logger.debug("Fetched {} changed songs with {}", len(changed), client.__class__.__name__)
+
+		return list(songs.values())
+
+	def discard(self, song_ids):
+		"""Remove songs from all snapshots, e.g. after deleting them."""
+
+		song_ids = set(song_ids)
+
+		with self._lock, self._connection() as conn:
+			for songs in self._songs.values():
+				for song_id in song_ids:
+					songs.pop(song_id, None)
+
+			conn.executemany(
+				"DELETE FROM songs WHERE id = ?",
+				((song_id,) for song_id in song_ids)
+			)
+
+	def close(self):
+		"""Close the snapshot database.
+
+		Listings stay in memory and the snapshot can still be used afterwards;
+		``refresh`` applies again to the next listing of each client.
+		"""
+
+		with self._lock:
+			if self._conn is not None:
+				self._conn.close()
+				self._conn = None
+
+			self._refreshed.clear()
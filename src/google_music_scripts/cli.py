@@ -1,11 +1,11 @@
 import argparse
 import math
 import re
+import sys
 import warnings
 from pathlib import Path
 
 from attr import attrib, attrs
-from audio_metadata import AudioMetadataWarning
 from loguru import logger
 from tbm_utils import (
 	Namespace,
@@ -25,14 +25,8 @@ from tbm_utils import (
 )
 
 from .__about__ import __title__, __version__
-from .commands import (
-	do_delete,
-	do_download,
-	do_quota,
-	do_search,
-	do_upload,
-)
 from .config import configure_logging, read_config_file
+from .phases import PHASES, Profiler, RunStats
 
 COMMAND_ALIASES = {
 	'del': 'delete',
@@ -44,6 +38,7 @@ COMMAND_ALIASES = {
 }
 
 COMMAND_KEYS = {
+	'daemon',
 	'del',
 	'delete',
 	'down',
@@ -57,6 +52,30 @@ COMMAND_KEYS = {
 FILTER_RE = re.compile(r'(([+-]+)?(.*?)\[(.*?)\])', re.I)
 
 
+def lazy_command(name):
+	"""Wrap a command function so its module and dependencies are imported when run.
+
+	This keeps parsing, help output, and errors from paying for
+	importing the Google Music clients and audio libraries.
+	"""
+
+	def command(args):
+		from audio_metadata import AudioMetadataWarning
+
+		from . import commands
+
+		warnings.simplefilter(
+			'ignore',
+			category=AudioMetadataWarning,
+		)
+
+		return getattr(commands, name)(args)
+
+	command.__name__ = name
+
+	return command
+
+
 @attrs(slots=True, frozen=True)
 class FilterCondition:
 	oper = attrib(converter=lambda o: '+' if o == '' else o)
@@ -163,12 +182,131 @@ mm_ident_options.add_argument(
 )
 
 
+###############
+# Diagnostics #
+###############
+
+diagnostics = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+diagnostics_options = diagnostics.add_argument_group("Diagnostics")
+diagnostics_options.add_argument(
+	'--profile',
+	metavar='PHASE',
+	nargs='?',
+	const='command',
+	choices=['command', *PHASES],
+	help=(
+		"Profile the command and save the profile to the log directory.\n"
+		"Optionally, profile only one phase of the command:\n"
+		f"{', '.join(PHASES)}"
+	)
+)
+diagnostics_options.add_argument(
+	'--stats-json',
+	metavar='PATH',
+	type=lambda p: custom_path(p).resolve(),
+	help="Write phase timings and counters of the command to a JSON file."
+)
+
+
+##########
+# Daemon #
+##########
+
+daemon_client = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+daemon_client_options = daemon_client.add_argument_group("Daemon")
+daemon_client_options.add_argument(
+	'--daemon',
+	action='store_true',
+	help="Run the command in a running gms daemon."
+)
+daemon_client_options.add_argument(
+	'--socket',
+	metavar='PATH',
+	type=lambda p: custom_path(p).resolve(),
+	help=(
+		"Location of the gms daemon socket.\n"
+		"Default: daemon.sock in the data directory."
+	)
+)
+
+daemon_server = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+daemon_server_options = daemon_server.add_argument_group("Daemon")
+daemon_server_options.add_argument(
+	'--socket',
+	metavar='PATH',
+	type=lambda p: custom_path(p).resolve(),
+	help=(
+		"Location of the socket to listen on.\n"
+		"Default: daemon.sock in the data directory."
+	)
+)
+
+
+###########
+# Library #
+###########
+
+library = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+library_options = library.add_argument_group("Library")
+library_options.add_argument(
+	'--refresh-library',
+	action='store_true',
+	help=(
+		"Fetch the full Google Music library listing.\n"
+		"Otherwise, only changes since the last run are fetched."
+	)
+)
+library_options.add_argument(
+	'--library-ttl',
+	metavar='HOURS',
+	type=float,
+	help=(
+		"Hours before the full Google Music library listing is fetched again.\n"
+		"Default: 24"
+	)
+)
+
+
 #########
 # Local #
 #########
 
 local = create_parser_local()
 
+# Scan
+
+scan = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+scan_options = scan.add_argument_group("Scan")
+scan_options.add_argument(
+	'--scan-workers',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of threads scanning local directories and files.\n"
+		"Default: 8"
+	)
+)
+
 
 ##########
 # Filter #
@@ -199,6 +337,127 @@ metadata_options.add_argument(
 filter_dates = create_parser_filter_dates()
 
 
+############
+# Transfer #
+############
+
+transfer = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+transfer_options = transfer.add_argument_group("Transfer")
+transfer_options.add_argument(
+	'--workers',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of songs to transfer concurrently.\n"
+		"Default: 1"
+	)
+)
+transfer_options.add_argument(
+	'--resume',
+	action='store_true',
+	help=(
+		"Transfer songs left over from the previous run\n"
+		"instead of finding songs to transfer."
+	)
+)
+transfer_options.add_argument(
+	'--retry-failed',
+	action='store_true',
+	help=(
+		"Transfer songs that failed in the previous run\n"
+		"instead of finding songs to transfer.\n"
+		"Can be combined with --resume."
+	)
+)
+
+
+##############
+# Throttling #
+##############
+
+throttling = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+throttling_options = throttling.add_argument_group("Throttling")
+throttling_options.add_argument(
+	'--rate-limit',
+	metavar='REQUESTS',
+	type=float,
+	help=(
+		"Maximum number of requests started per second.\n"
+		"Concurrency is adapted to throttling regardless.\n"
+		"Default: No limit"
+	)
+)
+throttling_options.add_argument(
+	'--retries',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of times to retry requests that were throttled\n"
+		"or failed with a server or connection error.\n"
+		"Default: 2"
+	)
+)
+
+
+###############
+# Delete Misc #
+###############
+
+delete_misc = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+delete_misc_options = delete_misc.add_argument_group("Misc")
+delete_misc_options.add_argument(
+	'--batch-size',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of songs to delete per request.\n"
+		"Default: 100"
+	)
+)
+delete_misc_options.add_argument(
+	'--workers',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of batches to delete concurrently.\n"
+		"Default: 1"
+	)
+)
+
+
+#################
+# Download Misc #
+#################
+
+download_misc = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+download_misc_options = download_misc.add_argument_group("Misc")
+download_misc_options.add_argument(
+	'--max-in-flight',
+	metavar='MiB',
+	type=int,
+	help=(
+		"Maximum size of songs being downloaded at once in mebibytes.\n"
+		"Default: 256"
+	)
+)
+
+
 ###############
 # Upload Misc #
 ###############
@@ -223,6 +482,25 @@ upload_misc_options.add_argument(
 		"Send empty audio sample."
 	)
 )
+upload_misc_options.add_argument(
+	'--cache-samples',
+	action='store_true',
+	help=(
+		"Keep audio samples of songs not yet uploaded for a week\n"
+		"so retried uploads don't create them again."
+	)
+)
+upload_misc_options.add_argument(
+	'--sample-lookahead',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of upcoming songs to create audio samples for\n"
+		"while uploading with --cache-samples.\n"
+		"Samples are used only if asked for the same time window.\n"
+		"Default: 0 (create samples when asked for)"
+	)
+)
 upload_misc_options.add_argument(
 	'--album-art',
 	metavar='ART_PATHS',
@@ -232,6 +510,82 @@ upload_misc_options.add_argument(
 		"Can be relative filenames and/or absolute filepaths."
 	)
 )
+upload_misc_options.add_argument(
+	'--embedded-art',
+	action='store_true',
+	help=(
+		"Upload downscaled copies of embedded album art\n"
+		"for songs without an album art file.\n"
+		"Requires Pillow."
+	)
+)
+upload_misc_options.add_argument(
+	'--embedded-art-size',
+	metavar='PIXELS',
+	type=int,
+	help=(
+		"Maximum width and height of downscaled embedded album art.\n"
+		"Default: 500"
+	)
+)
+upload_misc_options.add_argument(
+	'--transcode-workers',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of songs to transcode to MP3 at once ahead of uploading them.\n"
+		"Songs matched instead of uploaded are transcoded too.\n"
+		"Default: 0 (transcode while uploading)"
+	)
+)
+upload_misc_options.add_argument(
+	'--transcode-scratch',
+	metavar='MiB',
+	type=int,
+	help=(
+		"Maximum size of songs transcoded ahead of uploading in mebibytes.\n"
+		"Default: 1024"
+	)
+)
+
+
+#########
+# Watch #
+#########
+
+watch = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+watch_options = watch.add_argument_group("Watch")
+watch_options.add_argument(
+	'--watch',
+	action='store_true',
+	help=(
+		"After uploading, keep watching include directories\n"
+		"and upload new or modified songs."
+	)
+)
+watch_options.add_argument(
+	'--watch-delay',
+	metavar='SECONDS',
+	type=float,
+	help=(
+		"Seconds a new or modified file must be unchanged before it's uploaded.\n"
+		"Default: 5"
+	)
+)
+watch_options.add_argument(
+	'--poll-interval',
+	metavar='SECONDS',
+	type=float,
+	help=(
+		"Scan for changes every SECONDS instead of using inotify.\n"
+		"Useful for network file systems.\n"
+		"Default: Use inotify if available, otherwise scan every 30 seconds."
+	)
+)
 
 
 ########
@@ -265,6 +619,15 @@ sync_options.add_argument(
 	action='store_true',
 	help="Don't use metadata to sync songs."
 )
+sync_options.add_argument(
+	'--hash-workers',
+	metavar='NUM',
+	type=int,
+	help=(
+		"Number of processes generating audio hashes.\n"
+		"Default: Number of CPUs"
+	)
+)
 
 
 ##########
@@ -324,6 +687,29 @@ subcommands = gms.add_subparsers(
 )
 
 
+##########
+# Daemon #
+##########
+
+daemon_command = subcommands.add_parser(
+	'daemon',
+	description=(
+		"Run commands sent with --daemon, "
+		"keeping logins, library listings, and local indexes loaded between them."
+	),
+	help="Run a daemon for faster repeated commands.",
+	formatter_class=UsageHelpFormatter,
+	usage="gms daemon [OPTIONS]",
+	parents=[
+		meta,
+		logging_,
+		daemon_server,
+	],
+	add_help=False
+)
+daemon_command.set_defaults(func=lazy_command('do_daemon'))
+
+
 ##########
 # Delete #
 ##########
@@ -340,14 +726,19 @@ delete_command = subcommands.add_parser(
 		dry_run,
 		yes,
 		logging_,
+		diagnostics,
+		daemon_client,
 		ident,
 		mc_ident,
+		library,
 		filter_metadata,
 		filter_dates,
+		throttling,
+		delete_misc,
 	],
 	add_help=False
 )
-delete_command.set_defaults(func=do_delete)
+delete_command.set_defaults(func=lazy_command('do_delete'))
 
 
 ############
@@ -365,19 +756,26 @@ download_command = subcommands.add_parser(
 		meta,
 		dry_run,
 		logging_,
+		diagnostics,
+		daemon_client,
 		ident,
 		mm_ident,
 		mc_ident,
+		library,
 		local,
+		scan,
 		filter_metadata,
 		filter_dates,
+		transfer,
+		throttling,
+		download_misc,
 		sync,
 		output,
 		include,
 	],
 	add_help=False
 )
-download_command.set_defaults(func=do_download)
+download_command.set_defaults(func=lazy_command('do_download'))
 
 
 #########
@@ -393,12 +791,14 @@ quota_command = subcommands.add_parser(
 	parents=[
 		meta,
 		logging_,
+		diagnostics,
+		daemon_client,
 		ident,
 		mm_ident,
 	],
 	add_help=False
 )
-quota_command.set_defaults(func=do_quota)
+quota_command.set_defaults(func=lazy_command('do_quota'))
 
 
 ##########
@@ -415,12 +815,15 @@ search_command = subcommands.add_parser(
 		meta,
 		yes,
 		logging_,
+		diagnostics,
+		daemon_client,
 		mc_ident,
+		library,
 		filter_metadata,
 	],
 	add_help=False
 )
-search_command.set_defaults(func=do_search)
+search_command.set_defaults(func=lazy_command('do_search'))
 
 
 ##########
@@ -438,19 +841,26 @@ upload_command = subcommands.add_parser(
 		meta,
 		dry_run,
 		logging_,
+		diagnostics,
+		daemon_client,
 		ident,
 		mm_ident,
 		mc_ident,
+		library,
 		local,
+		scan,
 		filter_metadata,
 		filter_dates,
+		transfer,
+		throttling,
 		upload_misc,
+		watch,
 		sync,
 		include,
 	],
 	add_help=False
 )
-upload_command.set_defaults(func=do_upload)
+upload_command.set_defaults(func=lazy_command('do_upload'))
 
 
 def check_args(args):
@@ -504,12 +914,41 @@ def default_args(args):
 	else:
 		defaults.device_id = None
 
+	if args._command in [
+		'daemon',
+		'del',
+		'delete',
+		'down',
+		'download',
+		'quota',
+		'search',
+		'up',
+		'upload',
+	]:
+		defaults.socket = None
+
+	if args._command in ['del', 'delete', 'down', 'download', 'quota', 'search', 'up', 'upload']:
+		defaults.daemon = False
+
+	if args._command in ['del', 'delete', 'down', 'download', 'search', 'up', 'upload']:
+		defaults.refresh_library = False
+		defaults.library_ttl = 24
+
+	if args._command in ['del', 'delete', 'down', 'download', 'up', 'upload']:
+		defaults.rate_limit = None
+		defaults.retries = 2
+
 	if args._command in ['down', 'download', 'up', 'upload']:
 		defaults.no_recursion = False
 		defaults.max_depth = math.inf
 		defaults.exclude_paths = []
 		defaults.exclude_regexes = []
 		defaults.exclude_globs = []
+		defaults.workers = 1
+		defaults.resume = False
+		defaults.retry_failed = False
+		defaults.scan_workers = 8
+		defaults.hash_workers = None
 
 		if 'no_use_hash' in args:
 			defaults.use_hash = False
@@ -528,15 +967,29 @@ def default_args(args):
 	if args._command in ['down', 'download']:
 		defaults.output = str(Path('.').resolve())
 		defaults.include = []
+		defaults.max_in_flight = 256
 	elif args._command in ['up', 'upload']:
 		defaults.include = [custom_path('.').resolve()]
 		defaults.delete_on_success = False
 		defaults.no_sample = False
+		defaults.cache_samples = False
+		defaults.sample_lookahead = 0
 		defaults.album_art = None
+		defaults.embedded_art = False
+		defaults.embedded_art_size = 500
+		defaults.transcode_workers = 0
+		defaults.transcode_scratch = 1024
+		defaults.watch = False
+		defaults.watch_delay = 5
+		defaults.poll_interval = None
 
 	if args._command in ['del', 'delete', 'search']:
 		defaults.yes = False
 
+	if args._command in ['del', 'delete']:
+		defaults.batch_size = 100
+		defaults.workers = 1
+
 	config_defaults = get_defaults(
 		args._command,
 		read_config_file(
@@ -554,8 +1007,27 @@ def default_args(args):
 				parse_filter(filter_)
 				for filter_ in v
 			]
-		elif k == 'max_depth':
-			defaults.max_depth = int(v)
+		elif k in [
+			'batch_size',
+			'embedded_art_size',
+			'hash_workers',
+			'max_depth',
+			'max_in_flight',
+			'retries',
+			'sample_lookahead',
+			'scan_workers',
+			'transcode_scratch',
+			'transcode_workers',
+			'workers',
+		]:
+			defaults[k] = int(v)
+		elif k in [
+			'library_ttl',
+			'poll_interval',
+			'rate_limit',
+			'watch_delay',
+		]:
+			defaults[k] = float(v)
 		elif k == 'output':
 			defaults.output = str(custom_path(v))
 		elif k == 'include':
@@ -594,36 +1066,69 @@ def default_args(args):
 	return defaults
 
 
-def run():
-	warnings.simplefilter(
-		'ignore',
-		category=AudioMetadataWarning,
+def parse_command(argv=None):
+	"""Parse command line arguments and merge them with defaults from the config file."""
+
+	parsed = parse_args(gms, argv)
+
+	if parsed._command is None:
+		gms.parse_args(['-h'])
+
+	check_args(parsed)
+
+	defaults = default_args(parsed)
+	args = merge_defaults(defaults, parsed)
+
+	if args.get('no_recursion'):
+		args.max_depth = 0
+
+	return args
+
+
+def run_command(args):
+	configure_logging(
+		args.verbose - args.quiet,
+		username=args.username,
+		debug=args.debug,
+		log_to_stdout=args.log_to_stdout,
+		log_to_file=args.log_to_file
 	)
 
+	profiler = None
+	if args.get('profile'):
+		profiler = Profiler(phase=None if args.profile == 'command' else args.profile)
+
+	stats = RunStats(args._command)
+
 	try:
-		parsed = parse_args(gms)
+		with stats:
+			if profiler is not None:
+				with profiler:
+					args.func(args)
+			else:
+				args.func(args)
+	finally:
+		if profiler is not None:
+			profiler.save(username=args.username)
 
-		if parsed._command is None:
-			gms.parse_args(['-h'])
+		for line in stats.summary().splitlines():
+			logger.info(line)
 
-		check_args(parsed)
+		if args.get('stats_json'):
+			stats.write_json(args.stats_json)
 
-		defaults = default_args(parsed)
-		args = merge_defaults(defaults, parsed)
+	logger.log('NORMAL', "All done!")
 
-		if args.get('no_recursion'):
-			args.max_depth = 0
 
-		configure_logging(
-			args.verbose - args.quiet,
-			username=args.username,
-			debug=args.debug,
-			log_to_stdout=args.log_to_stdout,
-			log_to_file=args.log_to_file
-		)
+def run():
+	try:
+		args = parse_command()
+
+		if args.get('daemon'):
+			from .daemon import request
 
-		args.func(args)
+			sys.exit(request(sys.argv[1:], socket_path=args.socket))
 
-		logger.log('NORMAL', "All done!")
+		run_command(args)
 	except KeyboardInterrupt:
 		gms.exit(130, "\nInterrupted by user")
@@ -1,41 +1,166 @@
 import sys
+from pathlib import Path
 
-import google_music
-import google_music_utils as gm_utils
-from google_music_proto.musicmanager.utils import generate_client_id
 from loguru import logger
-from more_itertools import first_true
 from natsort import natsorted
 from tbm_utils import filter_filepaths_by_dates
 
+from .art import EmbeddedArtCache
+from .compare import compare_client_ids, compare_metadata
 from .core import (
+	delete_songs,
 	download_songs,
 	filter_google_dates,
 	get_google_songs,
 	get_local_songs,
 	upload_songs,
 )
+from .daemon import serve
+from .engine import gather, run, start, to_thread
+from .journal import TransferJournal
+from .phases import count, phase
+from .session import (
+	Session,
+	get_library_snapshot,
+	get_local_index,
+	get_mobileclient,
+	get_musicmanager,
+)
+from .throttle import Throttle
+from .transcode import SampleCache
 from .utils import template_to_base_path
+from .watch import watch_paths
 
 
-def do_delete(args):
+def _throttle(args):
+	return Throttle(
+		args.workers,
+		rate=args.rate_limit,
+		retries=args.retries
+	)
+
+
+def _in_phase(name, func, *args, **kwargs):
+	with phase(name):
+		return func(*args, **kwargs)
+
+
+def _local_client_ids(local_index, local_songs, *, workers=None):
+	return {
+		client_id
+		for _, client_id in local_index.client_ids(
+			local_songs,
+			workers=workers
+		)
+	}
+
+
+def _split_by_client_ids(local_index, local_songs, google_client_ids, *, workers=None):
+	missing_songs = []
+	existing_songs = []
+	for song, client_id in local_index.client_ids(
+		local_songs,
+		workers=workers
+	):
+		if client_id not in google_client_ids:
+			missing_songs.append(song)
+		else:
+			existing_songs.append(song)
+
+	return missing_songs, existing_songs
+
+
+async def _login_mobileclient(args):
 	logger.log('NORMAL', "Logging in to Mobile Client")
-	mc = google_music.mobileclient(args.username, device_id=args.device_id)
+	mc = await to_thread(
+		_in_phase,
+		'login',
+		get_mobileclient,
+		args.username,
+		device_id=args.device_id
+	)
 	if not mc.is_authenticated:
 		sys.exit("Failed to authenticate Mobile Client")
 
-	to_delete = filter_google_dates(
-		get_google_songs(mc, filters=args.filters),
-		created_in=args.get('created_in'),
-		created_on=args.get('created_on'),
-		created_before=args.get('created_before'),
-		created_after=args.get('created_after'),
-		modified_in=args.get('modified_in'),
-		modified_on=args.get('modified_on'),
-		modified_before=args.get('modified_before'),
-		modified_after=args.get('modified_after')
+	return mc
+
+
+async def _login_musicmanager(args):
+	logger.log('NORMAL', "Logging in to Music Manager")
+	mm = await to_thread(
+		_in_phase,
+		'login',
+		get_musicmanager,
+		args.username,
+		uploader_id=args.uploader_id
+	)
+	if not mm.is_authenticated:
+		sys.exit("Failed to authenticate Music Manager")
+
+	return mm
+
+
+def do_daemon(args):
+	with Session():
+		serve(
+			args.socket,
+			logging_kwargs={
+				'modifier': args.verbose - args.quiet,
+				'username': args.username,
+				'debug': args.debug,
+				'log_to_stdout': args.log_to_stdout,
+				'log_to_file': args.log_to_file,
+			}
+		)
+
+
+async def _delete(args):
+	mc = await _login_mobileclient(args)
+
+	snapshot = get_library_snapshot(
+		args.username,
+		refresh=args.refresh_library,
+		ttl=args.library_ttl * 3600
+	)
+
+	creation_dates = [
+		args[option]
+		for option in [
+			'created_in',
+			'created_on',
+			'created_before',
+			'created_after',
+		]
+		if option in args
+	]
+
+	modification_dates = [
+		args[option]
+		for option in [
+			'modified_in',
+			'modified_on',
+			'modified_before',
+			'modified_after',
+		]
+		if option in args
+	]
+
+	to_delete = await to_thread(
+		_in_phase,
+		'listing',
+		get_google_songs,
+		mc,
+		filters=args.filters,
+		snapshot=snapshot
 	)
 
+	with phase('listing'):
+		to_delete = filter_google_dates(
+			to_delete,
+			creation_dates=creation_dates,
+			modification_dates=modification_dates,
+		)
+
 	logger.info("Found {} songs to delete", len(to_delete))
 
 	if not to_delete:
@@ -45,39 +170,29 @@ def do_delete(args):
 			f"\nAre you sure you want to delete {len(to_delete)} song(s) from Google Music? (y/n) "
 		) in ("y", "Y")
 
-		if confirm:
-			logger.log('NORMAL', "Deleting songs")
-
-			song_num = 0
-			total = len(to_delete)
-			pad = len(str(total))
-
-			for song in to_delete:
-				song_num += 1
-
-				title = song.get('title', "<empty>")
-				artist = song.get('artist', "<empty>")
-				album = song.get('album', "<empty>")
-				song_id = song['id']
-
-				logger.trace(
-					"Deleting {} -- {} -- {} ({})",
-					title,
-					artist,
-					album,
-					song_id
-				)
-
-				mc.songs_delete(song)
+		if not confirm:
+			logger.info("No songs deleted")
 
-				logger.info(
-					"Deleted {:>{}}/{}",
-					song_num,
-					pad,
-					total
+		throttle = _throttle(args)
+		while confirm:
+			with phase('delete'):
+				deleted_ids, to_delete = delete_songs(
+					mc,
+					to_delete,
+					batch_size=args.batch_size,
+					workers=args.workers,
+					throttle=throttle
 				)
-		else:
-			logger.info("No songs deleted")
+			snapshot.discard(deleted_ids)
+
+			# Retry only the failed songs rather than re-running filters.
+			confirm = (
+				to_delete
+				and not args.yes
+				and input(
+					f"\nRetry deleting {len(to_delete)} failed song(s)? (y/n) "
+				) in ("y", "Y")
+			)
 	elif logger._core.min_level <= 15:
 		for song in to_delete:
 			title = song.get('title', "<empty>")
@@ -94,23 +209,63 @@ def do_delete(args):
 				song_id
 			)
 
+	snapshot.close()
 
-def do_download(args):
-	logger.log('NORMAL', "Logging in to Music Manager")
-	mm = google_music.musicmanager(args.username, uploader_id=args.uploader_id)
-	if not mm.is_authenticated:
-		sys.exit("Failed to authenticate Music Manager")
 
-	logger.log('NORMAL', "Logging in to Mobile Client")
-	mc = google_music.mobileclient(args.username, device_id=args.device_id)
-	if not mc.is_authenticated:
-		sys.exit("Failed to authenticate Mobile Client")
+def do_delete(args):
+	run(_delete(args))
+
+
+async def _plan_download(args, mm, local_index):
+	mc = await _login_mobileclient(args)
+
+	snapshot = get_library_snapshot(
+		args.username,
+		refresh=args.refresh_library,
+		ttl=args.library_ttl * 3600
+	)
+
+	# The Mobile Client listing is only needed to compare hashes,
+	# so it continues while local songs are scanned.
+	mc_listing = start(
+		to_thread(
+			_in_phase,
+			'listing',
+			get_google_songs,
+			mc,
+			filters=args.filters,
+			snapshot=snapshot
+		)
+	)
+
+	google_songs = await to_thread(
+		_in_phase,
+		'listing',
+		get_google_songs,
+		mm,
+		filters=args.filters,
+		snapshot=snapshot
+	)
 
-	google_songs = get_google_songs(mm, filters=args.filters)
 	base_path = template_to_base_path(args.output, google_songs)
 	filepaths = [base_path, *args.include]
 
-	mc_songs = get_google_songs(mc, filters=args.filters)
+	local_songs = await to_thread(
+		_in_phase,
+		'scan',
+		get_local_songs,
+		filepaths,
+		filters=args.filters,
+		max_depth=args.max_depth,
+		exclude_paths=args.exclude_paths,
+		exclude_regexes=args.exclude_regexes,
+		exclude_globs=args.exclude_globs,
+		local_index=local_index,
+		workers=args.scan_workers
+	)
+
+	mc_songs = await mc_listing
+	snapshot.close()
 
 	creation_dates = [
 		args[option]
@@ -134,20 +289,12 @@ def do_download(args):
 		if option in args
 	]
 
-	mc_songs = filter_google_dates(
-		mc_songs,
-		creation_dates=creation_dates,
-		modification_dates=modification_dates,
-	)
-
-	local_songs = get_local_songs(
-		filepaths,
-		filters=args.filters,
-		max_depth=args.max_depth,
-		exclude_paths=args.exclude_paths,
-		exclude_regexes=args.exclude_regexes,
-		exclude_globs=args.exclude_globs
-	)
+	with phase('listing'):
+		mc_songs = filter_google_dates(
+			mc_songs,
+			creation_dates=creation_dates,
+			modification_dates=modification_dates,
+		)
 
 	missing_songs = []
 	existing_songs = []
@@ -155,22 +302,21 @@ def do_download(args):
 		if google_songs and local_songs:
 			logger.log('NORMAL', "Comparing hashes")
 
-			google_client_id_map = {
-				mc_song.get('clientId'): mc_song
-				for mc_song in mc_songs
-			}
-			local_client_ids = {generate_client_id(song) for song in local_songs}
-			for client_id, mc_song in google_client_id_map.items():
-				song = first_true(
-					(song for song in google_songs),
-					pred=lambda song: song.get('id') == mc_song.get('id')
-				)
+			local_client_ids = await to_thread(
+				_in_phase,
+				'hash',
+				_local_client_ids,
+				local_index,
+				local_songs,
+				workers=args.hash_workers
+			)
 
-				if song is not None:
-					if client_id not in local_client_ids:
-						missing_songs.append(song)
-					else:
-						existing_songs.append(song)
+			with phase('hash'):
+				missing_songs, existing_songs = compare_client_ids(
+					google_songs,
+					mc_songs,
+					local_client_ids
+				)
 
 			logger.info("Found {} songs already exist by audio hash", len(existing_songs))
 
@@ -205,23 +351,17 @@ def do_download(args):
 		if google_songs and local_songs:
 			logger.log('NORMAL', "Comparing metadata")
 
-			missing_songs = natsorted(
-				gm_utils.find_missing_items(
+			with phase('metadata'):
+				missing_songs, existing_songs = compare_metadata(
 					google_songs,
 					local_songs,
-					fields=['artist', 'album', 'title', 'tracknumber'],
-					normalize_values=True
+					dst_tags=local_index.tags
 				)
-			)
+				count(items=len(google_songs))
 
-			existing_songs = natsorted(
-				gm_utils.find_existing_items(
-					google_songs,
-					local_songs,
-					fields=['artist', 'album', 'title', 'tracknumber'],
-					normalize_values=True
-				)
-			)
+			with phase('sort'):
+				missing_songs = natsorted(missing_songs)
+				existing_songs = natsorted(existing_songs)
 
 			logger.info(
 				"Found {} songs already exist by metadata",
@@ -255,12 +395,45 @@ def do_download(args):
 
 	logger.log('NORMAL', "Sorting songs")
 
-	to_download = natsorted(missing_songs)
+	with phase('sort'):
+		to_download = natsorted(missing_songs)
+		count(items=len(to_download))
 
 	logger.info("Found {} songs to download", len(to_download))
 
+	return to_download
+
+
+async def _download(args):
+	mm = await _login_musicmanager(args)
+
+	journal = TransferJournal('download', username=args.username)
+
+	if args.resume or args.retry_failed:
+		to_download = journal.pending(
+			remaining=args.resume,
+			failed=args.retry_failed
+		)
+
+		logger.info("Found {} songs to download from the previous run", len(to_download))
+	else:
+		with get_local_index(args.username) as local_index:
+			to_download = await _plan_download(args, mm, local_index)
+
 	if not args.dry_run:
-		download_songs(mm, to_download, template=args.output)
+		if not (args.resume or args.retry_failed):
+			journal.start(to_download)
+
+		with journal, phase('transfer'):
+			download_songs(
+				mm,
+				to_download,
+				template=args.output,
+				workers=args.workers,
+				max_in_flight=args.max_in_flight * 1024 * 1024,
+				journal=journal,
+				throttle=_throttle(args)
+			)
 	elif logger._core.min_level <= 15:
 		for song in to_download:
 			title = song.get('title', "<title>")
@@ -278,9 +451,14 @@ def do_download(args):
 			)
 
 
+def do_download(args):
+	run(_download(args))
+
+
 def do_quota(args):
 	logger.log('NORMAL', "Logging in to Music Manager")
-	mm = google_music.musicmanager(args.username, uploader_id=args.uploader_id)
+	with phase('login'):
+		mm = get_musicmanager(args.username, uploader_id=args.uploader_id)
 	if not mm.is_authenticated:
 		sys.exit("Failed to authenticate Music Manager")
 
@@ -295,13 +473,25 @@ def do_quota(args):
 	)
 
 
-def do_search(args):
-	logger.log('NORMAL', "Logging in to Mobile Client")
-	mc = google_music.mobileclient(args.username, device_id=args.device_id)
-	if not mc.is_authenticated:
-		sys.exit("Failed to authenticate Mobile Client")
+async def _search(args):
+	mc = await _login_mobileclient(args)
 
-	search_results = get_google_songs(mc, filters=args.filters)
+	snapshot = get_library_snapshot(
+		args.username,
+		refresh=args.refresh_library,
+		ttl=args.library_ttl * 3600
+	)
+
+	search_results = await to_thread(
+		_in_phase,
+		'listing',
+		get_google_songs,
+		mc,
+		filters=args.filters,
+		snapshot=snapshot
+	)
+
+	snapshot.close()
 
 	creation_dates = [
 		args[option]
@@ -325,20 +515,22 @@ def do_search(args):
 		if option in args
 	]
 
-	search_results = filter_google_dates(
-		search_results,
-		creation_dates=creation_dates,
-		modification_dates=modification_dates,
-	)
+	with phase('listing'):
+		search_results = filter_google_dates(
+			search_results,
+			creation_dates=creation_dates,
+			modification_dates=modification_dates,
+		)
 
-	search_results = natsorted(
-		search_results,
-		key=lambda song: (
-			song.get('artist', ''),
-			song.get('album', ''),
-			song.get('trackNumber', 0)
+	with phase('sort'):
+		search_results = natsorted(
+			search_results,
+			key=lambda song: (
+				song.get('artist', ''),
+				song.get('album', ''),
+				song.get('trackNumber', 0)
+			)
 		)
-	)
 
 	if search_results:
 		result_num = 0
@@ -376,24 +568,46 @@ def do_search(args):
 		logger.log('NORMAL', "No songs found matching query")
 
 
-def do_upload(args):
-	logger.log('NORMAL', "Logging in to Music Manager")
-	mm = google_music.musicmanager(args.username, uploader_id=args.uploader_id)
-	if not mm.is_authenticated:
-		sys.exit("Failed to authenticate Music Manager")
+def do_search(args):
+	run(_search(args))
 
-	logger.log('NORMAL', "Logging in to Mobile Client")
-	mc = google_music.mobileclient(args.username, device_id=args.device_id)
-	if not mc.is_authenticated:
-		sys.exit("Failed to authenticate Mobile Client")
 
-	local_songs = get_local_songs(
-		args.include,
+async def _plan_upload(args, mm, mc, local_index, snapshot, paths, *, root=None):
+	# Library listings continue while local songs are scanned and hashed.
+	listings = []
+
+	mc_listing = None
+	if args.use_hash:
+		mc_listing = start(to_thread(_in_phase, 'listing', get_google_songs, mc, snapshot=snapshot))
+		listings.append(mc_listing)
+
+	mm_listing = None
+	if args.use_metadata:
+		mm_listing = start(
+			to_thread(
+				_in_phase,
+				'listing',
+				get_google_songs,
+				mm,
+				filters=args.filters,
+				snapshot=snapshot
+			)
+		)
+		listings.append(mm_listing)
+
+	local_songs = await to_thread(
+		_in_phase,
+		'scan',
+		get_local_songs,
+		paths,
 		filters=args.filters,
 		max_depth=args.max_depth,
 		exclude_paths=args.exclude_paths,
 		exclude_regexes=args.exclude_regexes,
-		exclude_globs=args.exclude_globs
+		exclude_globs=args.exclude_globs,
+		local_index=local_index,
+		workers=args.scan_workers,
+		root=root
 	)
 
 	creation_dates = [
@@ -418,23 +632,33 @@ def do_upload(args):
 		if option in args
 	]
 
-	local_songs = filter_filepaths_by_dates(
-		local_songs,
-		creation_dates=creation_dates,
-		modification_dates=modification_dates,
-	)
+	with phase('scan'):
+		local_songs = filter_filepaths_by_dates(
+			local_songs,
+			creation_dates=creation_dates,
+			modification_dates=modification_dates,
+		)
 
 	missing_songs = []
 	if args.use_hash:
 		logger.log('NORMAL', "Comparing hashes")
 
-		existing_songs = []
-		google_client_ids = {song.get('clientId', '') for song in get_google_songs(mc)}
-		for song in local_songs:
-			if generate_client_id(song) not in google_client_ids:
-				missing_songs.append(song)
-			else:
-				existing_songs.append(song)
+		mc_songs = await mc_listing
+		google_client_ids = {
+			song.get('clientId', '')
+			for song in mc_songs
+		}
+
+		# Client IDs are compared as they're generated.
+		missing_songs, existing_songs = await to_thread(
+			_in_phase,
+			'hash',
+			_split_by_client_ids,
+			local_index,
+			local_songs,
+			google_client_ids,
+			workers=args.hash_workers
+		)
 
 		logger.info("Found {} songs already exist by audio hash", len(existing_songs))
 
@@ -449,25 +673,19 @@ def do_upload(args):
 		if local_songs:
 			logger.log('NORMAL', "Comparing metadata")
 
-			google_songs = get_google_songs(mm, filters=args.filters)
+			google_songs = await mm_listing
 
-			missing_songs = natsorted(
-				gm_utils.find_missing_items(
+			with phase('metadata'):
+				missing_songs, existing_songs = compare_metadata(
 					local_songs,
 					google_songs,
-					fields=['artist', 'album', 'title', 'tracknumber'],
-					normalize_values=True
+					src_tags=local_index.tags
 				)
-			)
+				count(items=len(local_songs))
 
-			existing_songs = natsorted(
-				gm_utils.find_existing_items(
-					local_songs,
-					google_songs,
-					fields=['artist', 'album', 'title', 'tracknumber'],
-					normalize_values=True
-				)
-			)
+			with phase('sort'):
+				missing_songs = natsorted(missing_songs)
+				existing_songs = natsorted(existing_songs)
 
 			logger.info("Found {} songs already exist by metadata", len(existing_songs))
 
@@ -478,23 +696,141 @@ def do_upload(args):
 	if not args.use_hash and not args.use_metadata:
 		missing_songs = local_songs
 
+	local_index.close()
+
+	# Wait on listings that weren't needed so they don't outlive planning.
+	await gather(*listings)
+
 	logger.log('NORMAL', "Sorting songs")
 
-	to_upload = natsorted(missing_songs)
+	with phase('sort'):
+		to_upload = natsorted(missing_songs)
+		count(items=len(to_upload))
 
 	logger.info("Found {} songs to upload", len(to_upload))
 
+	return to_upload
+
+
+def _upload(args, mm, to_upload, journal, throttle, embedded_art, sample_cache):
 	if not args.dry_run:
-		upload_songs(
-			mm,
-			to_upload,
-			album_art=args.album_art,
-			no_sample=args.no_sample,
-			delete_on_success=args.delete_on_success
-		)
+		with journal, phase('transfer'):
+			upload_songs(
+				mm,
+				to_upload,
+				album_art=args.album_art,
+				embedded_art=embedded_art,
+				no_sample=args.no_sample,
+				sample_cache=sample_cache,
+				transcode_workers=args.transcode_workers,
+				transcode_max_bytes=args.transcode_scratch * 1024 * 1024,
+				delete_on_success=args.delete_on_success,
+				workers=args.workers,
+				journal=journal,
+				throttle=throttle
+			)
 	elif logger._core.min_level <= 15:
 		for song in to_upload:
 			logger.log(
 				'ACTION_SUCCESS',
 				song
 			)
+
+
+async def _upload_command(args, local_index, snapshot):
+	embedded_art = None
+	if args.embedded_art:
+		try:
+			embedded_art = EmbeddedArtCache(args.username, max_size=args.embedded_art_size)
+		except ImportError as e:
+			sys.exit(str(e))
+
+	# Samples are cached by client IDs from the index instead of hashing songs again.
+	sample_cache = None
+	if (
+		args.cache_samples
+		and not args.no_sample
+	):
+		sample_cache = SampleCache(
+			local_index,
+			args.username,
+			lookahead=args.sample_lookahead
+		)
+
+	mm = await _login_musicmanager(args)
+
+	# Start watching before finding songs to upload
+	# so songs added in the meantime aren't missed.
+	watcher = None
+	if args.watch:
+		watch_dirs = [
+			path
+			for path in args.include
+			if path.is_dir()
+		]
+
+		if watch_dirs:
+			watcher = watch_paths(
+				watch_dirs,
+				max_depth=args.max_depth,
+				poll_interval=args.poll_interval
+			)
+		else:
+			logger.warning("No include directories to watch")
+
+	resume = args.resume or args.retry_failed
+
+	mc = None
+	if watcher is not None or not resume:
+		mc = await _login_mobileclient(args)
+
+	journal = TransferJournal('upload', username=args.username)
+
+	if resume:
+		to_upload = [
+			Path(filepath)
+			for filepath in journal.pending(
+				remaining=args.resume,
+				failed=args.retry_failed
+			)
+		]
+
+		logger.info("Found {} songs to upload from the previous run", len(to_upload))
+	else:
+		to_upload = await _plan_upload(args, mm, mc, local_index, snapshot, args.include)
+
+		if not args.dry_run:
+			journal.start(to_upload)
+
+	# Shared by every batch so adapted concurrency carries over.
+	throttle = _throttle(args)
+
+	_upload(args, mm, to_upload, journal, throttle, embedded_art, sample_cache)
+
+	if watcher is not None:
+		with watcher:
+			logger.log('NORMAL', "Watching for new or modified songs")
+
+			for root, filepaths in watcher.batches(args.watch_delay):
+				logger.info("Found {} new or modified files in {}", len(filepaths), root)
+
+				to_upload = await _plan_upload(args, mm, mc, local_index, snapshot, filepaths, root=root)
+
+				if to_upload:
+					if not args.dry_run:
+						journal.add(to_upload)
+
+					_upload(args, mm, to_upload, journal, throttle, embedded_art, sample_cache)
+
+
+def do_upload(args):
+	# Shared by every watch batch, so the library is loaded and refreshed once.
+	snapshot = get_library_snapshot(
+		args.username,
+		refresh=args.refresh_library,
+		ttl=args.library_ttl * 3600
+	)
+
+	# Closed even if uploading fails to save entries added so far.
+	with get_local_index(args.username) as local_index, snapshot:
+		run(_upload_command(args, local_index, snapshot))
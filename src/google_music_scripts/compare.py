@@ -0,0 +1,115 @@
+__all__ = [
+	'METADATA_FIELDS',
+	'compare_client_ids',
+	'compare_metadata',
+]
+
+from functools import lru_cache
+
+from google_music_utils.constants import FIELD_MAP
+from google_music_utils.utils import (
+	get_field,
+	get_item_tags,
+	list_to_single_value,
+	normalize_value,
+)
+
+METADATA_FIELDS = ['artist', 'album', 'title', 'tracknumber']
+
+
+def compare_client_ids(google_songs, mc_songs, client_ids):
+	"""Split Music Manager songs by whether their client ID is in ``client_ids``.
+
+	Music Manager songs don't include client IDs, so they are joined to
+	Mobile Client songs by song ID.
+
+	Returns:
+		tuple: Lists of missing and existing Music Manager songs.
+	"""
+
+	google_song_map = {}
+	for song in google_songs:
+		google_song_map.setdefault(song.get('id'), song)
+
+	mc_client_id_map = {
+		mc_song.get('clientId'): mc_song
+		for mc_song in mc_songs
+	}
+
+	missing_songs = []
+	existing_songs = []
+	for client_id, mc_song in mc_client_id_map.items():
+		song = google_song_map.get(mc_song.get('id'))
+
+		if song is not None:
+			if client_id not in client_ids:
+				missing_songs.append(song)
+			else:
+				existing_songs.append(song)
+
+	return missing_songs, existing_songs
+
+
+def compare_metadata(
+	src,
+	dst,
+	*,
+	fields=None,
+	src_tags=get_item_tags,
+	dst_tags=get_item_tags
+):
+	"""Split items by whether their normalized metadata is in another item collection.
+
+	The ``dst`` collection is indexed by normalized field values once,
+	then ``src`` is partitioned in a single pass. Normalized values are
+	cached, as values like artist and album repeat across a library.
+	Items whose tags can't be loaded are in neither result.
+
+	Parameters:
+		src (list): A list of item dicts or filepaths.
+		dst (list): A list of item dicts or filepaths.
+		fields (list, Optional): A list of fields used to compare items.
+			Default: :data:`METADATA_FIELDS`
+		src_tags (callable, Optional): Function to get the tags of a ``src`` item.
+		dst_tags (callable, Optional): Function to get the tags of a ``dst`` item.
+
+	Returns:
+		tuple: Lists of ``src`` items missing from and existing in ``dst``.
+	"""
+
+	if fields is None:
+		fields = METADATA_FIELDS
+
+	normalize = lru_cache(maxsize=None)(normalize_value)
+
+	def _metadata_key(tags):
+		return tuple(
+			normalize(
+				str(
+					list_to_single_value(
+						get_field(tags, field, field_map=FIELD_MAP)
+					)
+				)
+			)
+			for field in fields
+		)
+
+	dst_keys = set()
+	for item in dst:
+		tags = dst_tags(item)
+
+		if tags is not None:
+			dst_keys.add(_metadata_key(tags))
+
+	missing_items = []
+	existing_items = []
+	for item in src:
+		tags = src_tags(item)
+
+		if tags is not None:
+			if _metadata_key(tags) in dst_keys:
+				existing_items.append(item)
+			else:
+				missing_items.append(item)
+
+	return missing_items, existing_items
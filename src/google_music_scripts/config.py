@@ -11,6 +11,8 @@ from .__about__ import __author__, __title__
 
 CONFIG_BASE_PATH = Path(appdirs.user_config_dir(__title__, __author__))
 
+DATA_BASE_PATH = Path(appdirs.user_data_dir(__title__, __author__))
+
 LOG_BASE_PATH = Path(appdirs.user_data_dir(__title__, __author__))
 LOG_FORMAT = '<lvl>[{time:YYYY-MM-DD HH:mm:ss}]</lvl> {message}'
 LOG_DEBUG_FORMAT = LOG_FORMAT
@@ -37,12 +39,12 @@ def read_config_file(username=None):
 	config_path = CONFIG_BASE_PATH / (username or '') / 'google-music-scripts.toml'
 	config_file = TOMLFile(config_path)
 
+	# Only write a config file to create it if it doesn't exist.
 	try:
 		config = config_file.read()
 	except FileNotFoundError:
 		config = TOMLDocument()
-
-	write_config_file(config, username=username)
+		write_config_file(config, username=username)
 
 	return config
 
@@ -56,6 +58,13 @@ def write_config_file(config, username=None):
 	config_file.write(config)
 
 
+def ensure_data_dir(username=None):
+	data_dir = DATA_BASE_PATH / (username or '')
+	data_dir.mkdir(parents=True, exist_ok=True)
+
+	return data_dir
+
+
 def ensure_log_dir(username=None):
 	log_dir = LOG_BASE_PATH / (username or '') / 'logs'
 	log_dir.mkdir(parents=True, exist_ok=True)
@@ -1,17 +1,369 @@
+import bisect
+import calendar
 import math
-from collections import defaultdict
-from pathlib import Path
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path, PurePath
 
 import audio_metadata
+import google_music_proto.musicmanager.calls as mm_calls
 import google_music_utils as gm_utils
-import pendulum
+from google_music_utils.utils import get_item_tags
 from loguru import logger
-from tbm_utils import get_filepaths
+from oauthlib.oauth2 import TokenExpiredError
 
-from .utils import get_album_art_path
+from .engine import raise_if_cancelled
+from .filters import MetadataFilter
+from .phases import count
+from .throttle import Throttle
+from .transcode import TranscodePool
+from .utils import AlbumArtCache, ByteBudget
 
+SUPPORTED_FORMATS = {
+	audio_metadata.FLAC,
+	audio_metadata.MP3,
+	audio_metadata.OggOpus,
+	audio_metadata.OggVorbis,
+	audio_metadata.WAVE,
+}
 
-def download_songs(mm, songs, template=None):
+
+def _as_completed(futures):
+	"""Like :func:`as_completed`, but cancel pending futures if iteration stops early.
+
+	This keeps an interrupted run from waiting on every queued transfer.
+	"""
+
+	try:
+		yield from as_completed(futures)
+	except BaseException:
+		for future in futures:
+			future.cancel()
+
+		raise
+
+
+def _id3v2_size(header):
+	if (
+		len(header) < 10
+		or not header.startswith(b'ID3')
+	):
+		return None
+
+	# Tag size is a 28-bit synchsafe integer excluding the header.
+	size = 0
+	for byte in header[6:10]:
+		size = (size << 7) | (byte & 0x7f)
+
+	size += 10
+
+	if header[5] & 0x10:  # Footer present.
+		size += 10
+
+	return size
+
+
+def _load_download_tags(filepath):
+	"""Load tags of a downloaded song from only its ID3v2 header if possible."""
+
+	with open(filepath, 'rb') as f:
+		header = f.read(10)
+		size = _id3v2_size(header)
+
+		if size is not None:
+			return audio_metadata.ID3v2.parse(header + f.read(size - 10)).tags
+
+	return audio_metadata.load(filepath).tags
+
+
+# Download workers finding the token expired refresh it once.
+_token_lock = threading.Lock()
+
+
+def _add_token(mm, call):
+	session = mm._session
+
+	try:
+		return session.oauth_client.add_token(
+			call.url,
+			http_method=call.method,
+			headers=call.headers
+		)
+	except TokenExpiredError:
+		pass
+
+	with _token_lock:
+		try:
+			return session.oauth_client.add_token(
+				call.url,
+				http_method=call.method,
+				headers=call.headers
+			)
+		except TokenExpiredError:
+			session.refresh_token()
+
+			# Save the refreshed token like the client does after its own calls.
+			mm._token_handler.dump(mm.token)
+
+		return session.oauth_client.add_token(
+			call.url,
+			http_method=call.method,
+			headers=call.headers
+		)
+
+
+def _stream_song(mm, song, f):
+	"""Stream a song from a Google Music library into a file object."""
+
+	call = mm_calls.Export(mm.uploader_id, song['id'])
+	session = mm._session
+	url, headers, _ = _add_token(mm, call)
+
+	with session.stream(
+		call.method,
+		url,
+		headers=headers,
+		params={**call.params, **session.params},
+		allow_redirects=call.follow_redirects
+	) as response:
+		response.raise_for_status()
+
+		for chunk in response.iter_bytes():
+			f.write(chunk)
+
+
+def _template_base_dir(template):
+	"""Get the directory all songs downloaded with ``template`` are saved under."""
+
+	template = str(template)
+	path = Path(template)
+
+	if (
+		path == Path.cwd()
+		or path == Path('%suggested%')
+	):
+		return Path.cwd()
+
+	parts = []
+	for part in path.parts:
+		if '%' in part:
+			return Path(*parts)
+
+		parts.append(part)
+
+	# Without patterns, the template is a directory if it ends
+	# with a separator and the song's filepath otherwise.
+	if template.endswith(('/', '\\')):
+		return path
+
+	return path.parent
+
+
+def _download_song(mm, song, *, template, byte_budget=None):
+	logger.trace(
+		"Downloading -- {} - {} - {} ({})",
+		song.get('title', "<title>"),
+		song.get('artist', "<artist>"),
+		song.get('album', "<album>"),
+		song['id']
+	)
+
+	if byte_budget is None:
+		byte_budget = ByteBudget()
+
+	# Stream to a temporary file on the target filesystem
+	# and move it into place once complete.
+	temp_path = None
+	try:
+		temp_dir = _template_base_dir(template)
+		temp_dir.mkdir(parents=True, exist_ok=True)
+
+		with byte_budget.reserve(song.get('track_size', 0)):
+			with tempfile.NamedTemporaryFile(
+				dir=temp_dir,
+				prefix='.gms-',
+				suffix='.part',
+				delete=False
+			) as temp_file:
+				temp_path = Path(temp_file.name)
+				_stream_song(mm, song, temp_file)
+
+		tags = _load_download_tags(temp_path)
+
+		filepath = gm_utils.template_to_filepath(template, tags).with_suffix('.mp3')
+		filepath.parent.mkdir(parents=True, exist_ok=True)
+
+		try:
+			os.replace(temp_path, filepath)
+		except OSError:
+			shutil.move(str(temp_path), str(filepath))
+
+		temp_path = None
+	except Exception as e:  # TODO: More specific exception.
+		return None, e
+	finally:
+		# Also removes partial songs when interrupted.
+		if temp_path is not None:
+			try:
+				temp_path.unlink()
+			except OSError:
+				pass
+
+	return filepath, None
+
+
+def _delete_batch(mc, batch):
+	for song in batch:
+		logger.trace(
+			"Deleting {} -- {} -- {} ({})",
+			song.get('title', "<empty>"),
+			song.get('artist', "<empty>"),
+			song.get('album', "<empty>"),
+			song['id']
+		)
+
+	try:
+		success_ids = mc.songs_delete(batch)
+	except Exception as e:  # TODO: More specific exception.
+		return [], e
+
+	return success_ids, None
+
+
+def _result_error(result):
+	return result[1]
+
+
+def delete_songs(mc, songs, *, batch_size=100, workers=1, throttle=None):
+	"""Delete songs from a Google Music library in batches.
+
+	Parameters:
+		mc (google_music.MobileClient): A logged in Mobile Client.
+		songs (list): Google song dicts.
+		batch_size (int, Optional): Number of songs deleted per request.
+		workers (int, Optional): Number of batches deleted concurrently.
+		throttle (Throttle, Optional): Rate limits and retries requests.
+			Default: A throttle adapting concurrency up to ``workers``.
+
+	Returns:
+		tuple: List of deleted song IDs and list of songs that failed to delete.
+	"""
+
+	if not songs:
+		logger.log('NORMAL', "No songs to delete")
+
+		return [], []
+
+	logger.log('NORMAL', "Deleting songs")
+
+	batch_size = max(batch_size, 1)
+	batches = [
+		songs[i:i + batch_size]
+		for i in range(0, len(songs), batch_size)
+	]
+
+	batchnum = 0
+	total = len(batches)
+	pad = len(str(total))
+	deleted_ids = []
+	failed_songs = []
+
+	if throttle is None:
+		throttle = Throttle(workers)
+
+	with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+		futures = {
+			executor.submit(
+				throttle.call,
+				_delete_batch,
+				mc,
+				batch,
+				get_error=_result_error
+			): batch
+			for batch in batches
+		}
+
+		for future in _as_completed(futures):
+			batchnum += 1
+			batch = futures[future]
+			success_ids, error = future.result()
+
+			deleted_ids.extend(success_ids)
+			count(items=len(success_ids))
+
+			if error is not None:
+				failed_songs.extend(batch)
+
+				logger.log(
+					'ACTION_FAILURE',
+					"({:>{}}/{}) Failed to delete {} songs | {}",
+					batchnum,
+					pad,
+					total,
+					len(batch),
+					error
+				)
+			else:
+				success_ids = set(success_ids)
+				batch_failed = [
+					song
+					for song in batch
+					if song['id'] not in success_ids
+				]
+				failed_songs.extend(batch_failed)
+
+				if batch_failed:
+					logger.log(
+						'ACTION_FAILURE',
+						"({:>{}}/{}) Deleted {} songs, failed to delete {} songs",
+						batchnum,
+						pad,
+						total,
+						len(batch) - len(batch_failed),
+						len(batch_failed)
+					)
+				else:
+					logger.log(
+						'ACTION_SUCCESS',
+						"({:>{}}/{}) Deleted {} songs",
+						batchnum,
+						pad,
+						total,
+						len(batch)
+					)
+
+	logger.info("Deleted {}/{} songs", len(deleted_ids), len(songs))
+
+	for song in failed_songs:
+		logger.debug(
+			"Failed to delete {} -- {} -- {} ({})",
+			song.get('title', "<empty>"),
+			song.get('artist', "<empty>"),
+			song.get('album', "<empty>"),
+			song['id']
+		)
+
+	return deleted_ids, failed_songs
+
+
+def download_songs(
+	mm,
+	songs,
+	template=None,
+	*,
+	workers=1,
+	max_in_flight=None,
+	journal=None,
+	throttle=None
+):
 	if not songs:
 		logger.log('NORMAL', "No songs to download")
 	else:
@@ -23,34 +375,34 @@ def download_songs(mm, songs, template=None):
 		songnum = 0
 		total = len(songs)
 		pad = len(str(total))
+		byte_budget = ByteBudget(max_in_flight)
 
-		for song in songs:
-			songnum += 1
-
-			logger.trace(
-				"Downloading -- {} - {} - {} ({})",
-				song.get('title', "<title>"),
-				song.get('artist', "<artist>"),
-				song.get('album', "<album>"),
-				song['id']
-			)
+		if throttle is None:
+			throttle = Throttle(workers)
 
-			try:
-				audio, _ = mm.download(song)
-			except Exception as e:  # TODO: More specific exception.
-				logger.log(
-					'ACTION_FAILURE',
-					"({:>{}}/{}) Failed -- {} | {}",
-					songnum,
-					pad,
-					total,
+		with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+			futures = {
+				executor.submit(
+					throttle.call,
+					_download_song,
+					mm,
 					song,
-					e
-				)
-			else:
-				try:
-					tags = audio_metadata.loads(audio).tags
-				except audio_metadata.AudioMetadataException as e:
+					template=template,
+					byte_budget=byte_budget,
+					get_error=_result_error
+				): song
+				for song in songs
+			}
+
+			for future in _as_completed(futures):
+				songnum += 1
+				song = futures[future]
+				filepath, error = future.result()
+
+				if journal is not None:
+					journal.record(song, error)
+
+				if error is not None:
 					logger.log(
 						'ACTION_FAILURE',
 						"({:>{}}/{}) Failed -- {} | {}",
@@ -58,16 +410,13 @@ def download_songs(mm, songs, template=None):
 						pad,
 						total,
 						song,
-						e
+						error
 					)
 				else:
-					filepath = gm_utils.template_to_filepath(template, tags).with_suffix('.mp3')
-					if filepath.is_file():
-						filepath.unlink()
-
-					filepath.parent.mkdir(parents=True, exist_ok=True)
-					filepath.touch()
-					filepath.write_bytes(audio)
+					try:
+						count(items=1, num_bytes=filepath.stat().st_size)
+					except OSError:
+						count(items=1)
 
 					logger.log(
 						'ACTION_SUCCESS',
@@ -80,88 +429,97 @@ def download_songs(mm, songs, template=None):
 					)
 
 
+def _period_to_gm_bounds(period):
+	"""Convert a period to a half-open range of Google Music timestamps.
+
+	Matches the semantics of checking whether the whole-second datetime of a
+	Google Music timestamp (microseconds) falls within the inclusive period.
+	"""
+
+	start = calendar.timegm(period.start.utctimetuple()) * 1000000 + period.start.microsecond
+	end = calendar.timegm(period.end.utctimetuple()) * 1000000 + period.end.microsecond
+
+	# Round the bounds inward to whole seconds.
+	start_seconds = -(-start // 1000000)
+	end_seconds = end // 1000000
+
+	return start_seconds * 1000000, (end_seconds + 1) * 1000000
+
+
+def _timestamp_index(songs, field):
+	timestamps = [int(song[field]) for song in songs]
+	positions = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+
+	return [timestamps[position] for position in positions], positions
+
+
 def filter_google_dates(
 	songs,
 	*,
 	creation_dates=None,
 	modification_dates=None,
 ):
-	matched_songs = songs
+	matched_positions = None
 
-	def _dt_from_gm_timestamp(gm_timestamp):
-		return pendulum.from_timestamp(gm_utils.from_gm_timestamp(gm_timestamp))
+	for field, periods in [
+		('creationTimestamp', creation_dates),
+		('lastModifiedTimestamp', modification_dates),
+	]:
+		if not periods:
+			continue
 
-	def _match_created_date(songs, period):
-		return (
-			song
-			for song in songs
-			if _dt_from_gm_timestamp(song['creationTimestamp']) in period
-		)
+		timestamps, positions = _timestamp_index(songs, field)
 
-	def _match_modified_date(songs, period):
-		return (
-			song
-			for song in songs
-			if _dt_from_gm_timestamp(song['lastModifiedTimestamp']) in period
-		)
+		for period in periods:
+			start, end = _period_to_gm_bounds(period)
+			period_positions = positions[
+				bisect.bisect_left(timestamps, start):bisect.bisect_left(timestamps, end)
+			]
 
-	if creation_dates:
-		for period in creation_dates:
-			matched_songs = _match_created_date(matched_songs, period)
+			if matched_positions is None:
+				matched_positions = set(period_positions)
+			else:
+				matched_positions.intersection_update(period_positions)
 
-	if modification_dates:
-		for period in modification_dates:
-			matched_songs = _match_modified_date(matched_songs, period)
+	if matched_positions is None:
+		return list(songs)
 
-	return list(matched_songs)
+	return [
+		songs[position]
+		for position in sorted(matched_positions)
+	]
 
 
-def filter_metadata(songs, filters):
-	if filters:
-		logger.log('NORMAL', "Filtering songs by metadata")
-		matched_songs = []
+def _song_key(song):
+	if isinstance(song, Mapping):
+		return song.get('id', id(song))
 
-		for filter_ in filters:
-			include_filters = defaultdict(list)
-			exclude_filters = defaultdict(list)
+	return song
 
-			for condition in filter_:
-				if condition.oper == '+':
-					include_filters[condition.field].append(condition.pattern)
-				elif condition.oper == '-':
-					exclude_filters[condition.field].append(condition.pattern)
 
-			matched = songs
+def filter_metadata(songs, filters, *, get_tags=get_item_tags):
+	if filters:
+		logger.log('NORMAL', "Filtering songs by metadata")
 
-			# Use all if multiple conditions for inclusion.
-			i_use_all = (
-				(len(include_filters) > 1)
-				or any(
-					len(v) > 1
-					for v in include_filters.values()
-				)
-			)
-			i_any_all = all if i_use_all else any
-			matched = gm_utils.include_items(
-				matched, any_all=i_any_all, ignore_case=True, **include_filters
-			)
+		metadata_filters = [
+			MetadataFilter.from_conditions(filter_)
+			for filter_ in filters
+		]
 
-			# Use any if multiple conditions for exclusion.
-			e_use_all = not (
-				(len(exclude_filters) > 1)
-				or any(
-					len(v) > 1
-					for v in exclude_filters.values()
-				)
-			)
-			e_any_all = all if e_use_all else any
-			matched = gm_utils.exclude_items(
-				matched, any_all=e_any_all, ignore_case=True, **exclude_filters
-			)
+		matched_songs = []
+		matched_keys = set()
+		for song in songs:
+			tags = get_tags(song)
 
-			for song in matched:
-				if song not in matched_songs:
+			if any(
+				metadata_filter.matches(tags)
+				for metadata_filter in metadata_filters
+			):
+				key = _song_key(song)
+
+				if key not in matched_keys:
 					matched_songs.append(song)
+					matched_keys.add(key)
 
 		logger.info("Filtered {} songs by metadata", len(songs) - len(matched_songs))
 	else:
@@ -170,20 +528,130 @@ def filter_metadata(songs, filters):
 	return matched_songs
 
 
-def get_google_songs(client, *, filters=None):
+def get_google_songs(client, *, filters=None, snapshot=None):
 	logger.log('NORMAL', "Loading Google songs with {}", client.__class__.__name__)
 
-	google_songs = client.songs()
+	if snapshot is not None:
+		google_songs = snapshot.songs(client)
+	else:
+		google_songs = client.songs()
 
 	logger.info(
 		"Found {} Google songs with {}", len(google_songs), client.__class__.__name__
 	)
+	count(items=len(google_songs))
 
 	matched_songs = filter_metadata(google_songs, filters)
 
 	return matched_songs
 
 
+def _exclude_filepath(
+	filepath,
+	*,
+	root=None,
+	exclude_paths=None,
+	exclude_regexes=None,
+	exclude_globs=None
+):
+	if exclude_paths and any(
+		str(PurePath(exclude_path)) in str(filepath)
+		for exclude_path in exclude_paths
+	):
+		return True
+
+	if exclude_regexes:
+		resolved = str(filepath.resolve())
+
+		if any(
+			re.search(regex, resolved)
+			for regex in exclude_regexes
+		):
+			return True
+
+	if root is not None and exclude_globs:
+		relpath = filepath.relative_to(root)
+
+		if any(
+			relpath.match(exclude_glob)
+			for exclude_glob in exclude_globs
+		):
+			return True
+
+	return False
+
+
+def _is_song(filepath, *, root, determine_format, **exclude_kwargs):
+	"""Check if a local file is a non-excluded song in a supported format.
+
+	Returns:
+		bool: ``True`` if it is, ``None`` if the file couldn't be read.
+	"""
+
+	if _exclude_filepath(filepath, root=root, **exclude_kwargs):
+		return False
+
+	try:
+		return determine_format(filepath) in SUPPORTED_FORMATS
+	except Exception as e:  # TODO: More specific exception.
+		logger.warning("Failed to read {}: {}", filepath, e)
+
+		return None
+
+
+def _scan_directory(dirpath, *, root, determine_format, **exclude_kwargs):
+	"""List a directory and detect the format of its non-excluded files.
+
+	A file or directory that can't be read is skipped without
+	stopping the scan of the rest.
+
+	Returns:
+		tuple: ``(filepaths, num_files, dirpaths, complete)`` of supported songs,
+		number of files found, subdirectories, and whether every entry was read.
+	"""
+
+	filepaths = []
+	dirpaths = []
+	num_files = 0
+	complete = True
+
+	try:
+		entries = list(os.scandir(dirpath))
+	except OSError as e:
+		logger.warning("Failed to scan {}: {}", dirpath, e)
+
+		return filepaths, num_files, dirpaths, False
+
+	for entry in entries:
+		try:
+			if entry.is_dir(follow_symlinks=False):
+				dirpaths.append(entry.path)
+				continue
+			elif not entry.is_file():
+				continue
+		except OSError as e:
+			logger.warning("Failed to read {}: {}", entry.path, e)
+			complete = False
+			continue
+
+		num_files += 1
+		filepath = Path(entry.path)
+
+		is_song = _is_song(
+			filepath,
+			root=root,
+			determine_format=determine_format,
+			**exclude_kwargs
+		)
+
+		if is_song:
+			filepaths.append(filepath)
+		elif is_song is None:
+			complete = False
+
+	return filepaths, num_files, dirpaths, complete
+
+
 def get_local_songs(
 	paths,
 	*,
@@ -191,42 +659,174 @@ def get_local_songs(
 	max_depth=math.inf,
 	exclude_paths=None,
 	exclude_regexes=None,
-	exclude_globs=None
+	exclude_globs=None,
+	local_index=None,
+	workers=8,
+	root=None
 ):
 	logger.log('NORMAL', "Loading local songs")
 
-	local_songs = [
-		filepath
-		for filepath in get_filepaths(
-			paths,
-			max_depth=max_depth,
-			exclude_paths=exclude_paths,
-			exclude_regexes=exclude_regexes,
-			exclude_globs=exclude_globs
-		)
-		if audio_metadata.determine_format(filepath) in [
-			audio_metadata.FLAC,
-			audio_metadata.MP3,
-			audio_metadata.OggOpus,
-			audio_metadata.OggVorbis,
-			audio_metadata.WAVE,
-		]
-	]
+	if local_index is not None:
+		determine_format = local_index.audio_format
+	else:
+		determine_format = audio_metadata.determine_format
+
+	exclude_kwargs = {
+		'exclude_paths': exclude_paths,
+		'exclude_regexes': exclude_regexes,
+		'exclude_globs': exclude_globs,
+	}
+
+	local_songs = []
+	num_scanned = 0
+	complete = True
+	start_time = time.perf_counter()
+
+	# Each directory is listed and its files' formats detected in the pool
+	# so both overlap across many files and directories.
+	with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+		done = queue.Queue()
+		futures = []
+		pending = 0
+
+		def _submit(dirpath, scan_root, depth):
+			future = executor.submit(
+				_scan_directory,
+				dirpath,
+				root=scan_root,
+				determine_format=determine_format,
+				**exclude_kwargs
+			)
+			future.add_done_callback(
+				lambda future: done.put((future, scan_root, depth))
+			)
+			futures.append(future)
+
+		try:
+			for path in paths:
+				raise_if_cancelled()
+
+				path = Path(path).resolve()
+
+				if path.is_dir():
+					_submit(path, path, 0)
+					pending += 1
+				elif path.is_file():
+					num_scanned += 1
+
+					is_song = _is_song(
+						path,
+						root=root,
+						determine_format=determine_format,
+						**exclude_kwargs
+					)
+
+					if is_song:
+						local_songs.append(path)
+					elif is_song is None:
+						complete = False
+
+			while pending:
+				future, scan_root, depth = done.get()
+				pending -= 1
+
+				filepaths, num_files, dirpaths, scanned = future.result()
+				local_songs.extend(filepaths)
+				num_scanned += num_files
+				complete = complete and scanned
+
+				raise_if_cancelled()
+
+				if depth < max_depth:
+					for dirpath in dirpaths:
+						_submit(dirpath, scan_root, depth + 1)
+						pending += 1
+		except BaseException:
+			# Don't wait on directories queued before stopping.
+			for future in futures:
+				future.cancel()
+
+			raise
+
+	local_songs.sort()
+
+	elapsed = time.perf_counter() - start_time
+
+	logger.info(
+		"Scanned {} files in {:.2f}s ({:.2f} files/s)",
+		num_scanned,
+		elapsed,
+		num_scanned / elapsed if elapsed else 0
+	)
+	count(items=num_scanned)
+
+	# Entries of files that couldn't be read are kept for the next scan.
+	if (
+		local_index is not None
+		and complete
+	):
+		local_index.prune(paths)
 
 	logger.info("Found {} local songs", len(local_songs))
 
-	matched_songs = filter_metadata(local_songs, filters)
+	if local_index is not None:
+		matched_songs = filter_metadata(local_songs, filters, get_tags=local_index.tags)
+	else:
+		matched_songs = filter_metadata(local_songs, filters)
 
 	return matched_songs
 
 
+def _upload_song(mm, filepath, *, album_art_path=None, embedded_art=None, no_sample=False):
+	logger.trace(
+		"Uploading -- {}",
+		filepath
+	)
+
+	song = filepath
+
+	try:
+		if (
+			album_art_path is None
+			and embedded_art is not None
+		):
+			# Load once for both the album art and the upload.
+			song = audio_metadata.load(filepath)
+			album_art_path = embedded_art.get(song)
+
+		result = mm.upload(
+			song,
+			album_art_path=album_art_path,
+			no_sample=no_sample
+		)
+	except Exception as e:  # TODO: More specific exception.
+		result = {
+			'filepath': filepath,
+			'success': False,
+			'reason': e,
+		}
+
+	return result
+
+
+def _upload_error(result):
+	return None if 'song_id' in result else result['reason']
+
+
 def upload_songs(
 	mm,
 	filepaths,
 	*,
 	album_art=None,
+	embedded_art=None,
 	no_sample=False,
-	delete_on_success=False
+	sample_cache=None,
+	transcode_workers=0,
+	transcode_max_bytes=None,
+	delete_on_success=False,
+	workers=1,
+	journal=None,
+	throttle=None
 ):
 	if not filepaths:
 		logger.log('NORMAL', "No songs to upload")
@@ -236,77 +836,138 @@ def upload_songs(
 		filenum = 0
 		total = len(filepaths)
 		pad = len(str(total))
-
-		for song in filepaths:
-			filenum += 1
-
-			logger.trace(
-				"Uploading -- {}",
-				song
-			)
-
-			album_art_path = get_album_art_path(song, album_art)
-
-			try:
-				result = mm.upload(
-					song,
-					album_art_path=album_art_path,
-					no_sample=no_sample
+		total_bytes = 0
+		num_failed = 0
+		start_time = time.perf_counter()
+
+		if throttle is None:
+			throttle = Throttle(workers)
+
+		# Resolved while submitting, once per directory.
+		album_art_cache = AlbumArtCache(album_art)
+
+		with ExitStack() as stack:
+			executor = stack.enter_context(ThreadPoolExecutor(max_workers=max(workers, 1)))
+
+			if (
+				sample_cache is not None
+				and not no_sample
+			):
+				stack.enter_context(sample_cache.installed(filepaths))
+
+			# Closed before waiting on uploads when interrupted,
+			# so none are left waiting on a song that won't be transcoded.
+			transcode_pool = None
+			if transcode_workers:
+				transcode_pool = stack.enter_context(
+					TranscodePool(
+						filepaths,
+						workers=transcode_workers,
+						max_bytes=transcode_max_bytes
+					)
 				)
-			except Exception as e:  # TODO: More specific exception.
-				result = {
-					'filepath': song,
-					'success': False,
-					'reason': e,
-				}
-
-			if logger._core.min_level <= 15:
+				stack.enter_context(transcode_pool.installed())
+			futures = {
+				executor.submit(
+					throttle.call,
+					_upload_song,
+					mm,
+					song,
+					album_art_path=album_art_cache.get(song),
+					embedded_art=embedded_art,
+					no_sample=no_sample,
+					get_error=_upload_error
+				): song
+				for song in filepaths
+			}
+
+			for future in _as_completed(futures):
+				filenum += 1
+				result = future.result()
+
+				# Only songs actually sent count towards throughput, not matched ones.
+				size = 0
 				if result['reason'] == 'Uploaded':
-					logger.log(
-						'ACTION_SUCCESS',
-						"({:>{}}/{}) Uploaded -- {} ({})",
-						filenum,
-						pad,
-						total,
-						result['filepath'],
-						result['song_id']
-					)
-				elif result['reason'] == 'Matched':
-					logger.log(
-						'ACTION_SUCCESS',
-						"({:>{}}/{}) Matched -- {} ({})",
-						filenum,
-						pad,
-						total,
-						result['filepath'],
-						result['song_id']
-					)
-				else:
-					if 'song_id' in result:
+					try:
+						size = futures[future].stat().st_size
+					except OSError:
+						pass
+				elif 'song_id' not in result:
+					num_failed += 1
+
+				total_bytes += size
+				count(items=1, num_bytes=size)
+
+				if journal is not None:
+					journal.record(futures[future], _upload_error(result))
+
+				if (
+					sample_cache is not None
+					and 'song_id' in result
+				):
+					sample_cache.discard(futures[future])
+
+				if transcode_pool is not None:
+					transcode_pool.discard(futures[future])
+
+				if logger._core.min_level <= 15:
+					if result['reason'] == 'Uploaded':
 						logger.log(
 							'ACTION_SUCCESS',
-							"({:>{}}/{}) Already exists -- {} ({})",
+							"({:>{}}/{}) Uploaded -- {} ({})",
 							filenum,
 							pad,
 							total,
 							result['filepath'],
 							result['song_id']
 						)
-					else:
+					elif result['reason'] == 'Matched':
 						logger.log(
-							'ACTION_FAILURE',
-							"({:>{}}/{}) Failed -- {} | {}",
+							'ACTION_SUCCESS',
+							"({:>{}}/{}) Matched -- {} ({})",
 							filenum,
 							pad,
 							total,
 							result['filepath'],
-							result['reason']
+							result['song_id']
+						)
+					else:
+						if 'song_id' in result:
+							logger.log(
+								'ACTION_SUCCESS',
+								"({:>{}}/{}) Already exists -- {} ({})",
+								filenum,
+								pad,
+								total,
+								result['filepath'],
+								result['song_id']
+							)
+						else:
+							logger.log(
+								'ACTION_FAILURE',
+								"({:>{}}/{}) Failed -- {} | {}",
+								filenum,
+								pad,
+								total,
+								result['filepath'],
+								result['reason']
+							)
+
+				if delete_on_success and 'song_id' in result:
+					try:
+						result['filepath'].unlink()
+					except Exception:
+						logger.warning(
+							"Failed to remove {} after successful upload", result['filepath']
 						)
 
-			if delete_on_success and 'song_id' in result:
-				try:
-					result['filepath'].unlink()
-				except Exception:
-					logger.warning(
-						"Failed to remove {} after successful upload", result['filepath']
-					)
+		elapsed = time.perf_counter() - start_time
+
+		logger.info(
+			"Processed {} songs ({} failed) in {:.2f}s ({:.2f} files/s, {:.2f} MB/s)",
+			total,
+			num_failed,
+			elapsed,
+			total / elapsed if elapsed else 0,
+			total_bytes / 1000000 / elapsed if elapsed else 0
+		)
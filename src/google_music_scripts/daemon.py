@@ -0,0 +1,259 @@
+__all__ = [
+	'request',
+	'serve',
+]
+
+import builtins
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from contextlib import ExitStack, contextmanager, redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from loguru import logger
+
+from . import cli
+from .config import configure_logging, ensure_data_dir
+
+DAEMON_SOCKET_FILENAME = 'daemon.sock'
+
+
+def _socket_path(path=None):
+	if path is None:
+		return ensure_data_dir() / DAEMON_SOCKET_FILENAME
+
+	return Path(path)
+
+
+class _Connection:
+	"""Exchange JSON messages, one per line, over a socket's file objects."""
+
+	def __init__(self, rfile, wfile):
+		self.rfile = rfile
+		self.wfile = wfile
+
+	def send(self, **message):
+		self.wfile.write(json.dumps(message).encode('utf8') + b'\n')
+		self.wfile.flush()
+
+	def receive(self):
+		line = self.rfile.readline()
+
+		if not line:
+			return None
+
+		return json.loads(line)
+
+
+class _Stream(io.TextIOBase):
+	"""Text stream sending writes to the client as ``name`` messages."""
+
+	def __init__(self, connection, name):
+		self._connection = connection
+		self._name = name
+
+	def write(self, text):
+		try:
+			self._connection.send(**{self._name: text})
+		except OSError:
+			# The client went away, e.g. interrupted with Ctrl-C.
+			# Stop the command as if it was interrupted here.
+			raise KeyboardInterrupt
+
+		return len(text)
+
+
+@contextmanager
+def _prompt_client(connection):
+	"""Send prompts from :func:`input` to the client and return its replies."""
+
+	def prompt(message=''):
+		try:
+			connection.send(prompt=str(message))
+			reply = connection.receive()
+		except OSError:
+			raise KeyboardInterrupt
+
+		if reply is None:
+			raise KeyboardInterrupt
+
+		if 'input' not in reply:
+			raise EOFError
+
+		return reply['input']
+
+	original = builtins.input
+	builtins.input = prompt
+
+	try:
+		yield
+	finally:
+		builtins.input = original
+
+
+def _exit_code(e):
+	if e.code is None:
+		return 0
+	elif isinstance(e.code, int):
+		return e.code
+	else:
+		print(e.code, file=sys.stderr)
+
+		return 1
+
+
+def _run_request(message, connection):
+	cwd = os.getcwd()
+
+	try:
+		os.chdir(message['cwd'])
+
+		with ExitStack() as stack:
+			stack.enter_context(redirect_stdout(_Stream(connection, 'stdout')))
+			stack.enter_context(redirect_stderr(_Stream(connection, 'stderr')))
+			stack.enter_context(_prompt_client(connection))
+
+			try:
+				args = cli.parse_command(message['argv'])
+
+				if args.get('watch'):
+					sys.exit("--watch can't be used with --daemon")
+
+				cli.run_command(args)
+			except SystemExit as e:
+				code = _exit_code(e)
+			except Exception:
+				traceback.print_exc()
+				code = 1
+			else:
+				code = 0
+	finally:
+		os.chdir(cwd)
+
+	connection.send(exit=code)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		connection = _Connection(self.rfile, self.wfile)
+
+		message = connection.receive()
+		if message is None:
+			return
+
+		logger.info("Running: gms {}", ' '.join(message['argv']))
+
+		disconnected = False
+		try:
+			_run_request(message, connection)
+		except (KeyboardInterrupt, OSError):
+			disconnected = True
+		finally:
+			configure_logging(**self.server.logging_kwargs)
+
+		if disconnected:
+			logger.info("Client disconnected, stopped command")
+
+
+def _check_socket(path):
+	"""Remove a socket file left over by a daemon that didn't shut down cleanly."""
+
+	if not path.exists():
+		return
+
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		try:
+			sock.connect(str(path))
+		except OSError:
+			path.unlink()
+		else:
+			sys.exit(f"A gms daemon is already listening on {path}")
+
+
+def serve(socket_path=None, *, logging_kwargs=None):
+	"""Run commands sent by :func:`request` until interrupted.
+
+	Commands are run one at a time in this process, so an active
+	:class:`~google_music_scripts.session.Session` keeps clients,
+	library snapshots, and local indexes warm between them.
+
+	Parameters:
+		socket_path (str, os.PathLike, Optional): Location of the Unix socket.
+			Default: ``daemon.sock`` in the data directory.
+		logging_kwargs (dict, Optional): Arguments to
+			:func:`~google_music_scripts.config.configure_logging`
+			restoring the daemon's logging after each command.
+	"""
+
+	socket_path = _socket_path(socket_path)
+	_check_socket(socket_path)
+
+	# Only the user running the daemon may connect to the socket.
+	umask = os.umask(0o177)
+	try:
+		server = socketserver.UnixStreamServer(str(socket_path), _RequestHandler)
+	finally:
+		os.umask(umask)
+
+	server.logging_kwargs = logging_kwargs or {}
+
+	# Shut down cleanly when stopped by a service manager.
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+	logger.log('NORMAL', "Listening on {}", socket_path)
+
+	try:
+		with server:
+			server.serve_forever()
+	finally:
+		socket_path.unlink()
+
+
+def request(argv, *, socket_path=None):
+	"""Run a command in a daemon started with :func:`serve`.
+
+	Output and prompts of the command are relayed to this process.
+
+	Parameters:
+		argv (list): Command line arguments of the command.
+		socket_path (str, os.PathLike, Optional): Location of the Unix socket.
+			Default: ``daemon.sock`` in the data directory.
+
+	Returns:
+		int: Exit code of the command.
+	"""
+
+	socket_path = _socket_path(socket_path)
+
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		try:
+			sock.connect(str(socket_path))
+		except OSError:
+			sys.exit(f"No gms daemon listening on {socket_path}")
+
+		connection = _Connection(sock.makefile('rb'), sock.makefile('wb'))
+		connection.send(argv=argv, cwd=os.getcwd())
+
+		while True:
+			message = connection.receive()
+
+			if message is None:
+				sys.exit("Lost connection to gms daemon")
+			elif 'stdout' in message:
+				sys.stdout.write(message['stdout'])
+				sys.stdout.flush()
+			elif 'stderr' in message:
+				sys.stderr.write(message['stderr'])
+				sys.stderr.flush()
+			elif 'prompt' in message:
+				try:
+					connection.send(input=input(message['prompt']))
+				except EOFError:
+					connection.send(eof=True)
+			elif 'exit' in message:
+				return message['exit']
@@ -0,0 +1,201 @@
+__all__ = [
+	'Cancelled',
+	'gather',
+	'raise_if_cancelled',
+	'run',
+	'start',
+	'to_thread',
+]
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Executor, Future
+
+from loguru import logger
+
+from .phases import profile_thread
+
+# Thread executors of running command loops.
+_executors = {}
+
+# Cancellation event of the command a thread is running a call for.
+_local = threading.local()
+
+
+class Cancelled(BaseException):
+	"""Raised in blocking calls of a command that was interrupted or failed.
+
+	Like :exc:`KeyboardInterrupt`, it isn't caught by handlers of failed calls.
+	"""
+
+
+def raise_if_cancelled():
+	"""Stop a blocking call of a command that was interrupted or failed.
+
+	Long-running calls check between units of work, e.g. pages of a listing
+	or directories of a scan, so they stop where it's safe to.
+	Does nothing outside of calls run with :func:`to_thread`.
+
+	Raises:
+		Cancelled: If the command was cancelled.
+	"""
+
+	cancelled = getattr(_local, 'cancelled', None)
+
+	if (
+		cancelled is not None
+		and cancelled.is_set()
+	):
+		raise Cancelled
+
+
+class _Threads(Executor):
+	"""Run each call in a daemon thread of its own.
+
+	Blocking calls of a command are few and long-running, e.g. a library
+	listing or a local scan, so a thread each keeps them all concurrent.
+	Cancelling sets an event the calls check with :func:`raise_if_cancelled`.
+	"""
+
+	def __init__(self):
+		self.cancelled = threading.Event()
+
+		self._threads = set()
+		self._lock = threading.Lock()
+
+	def submit(self, fn, *args, **kwargs):
+		future = Future()
+
+		def run():
+			_local.cancelled = self.cancelled
+
+			try:
+				if future.set_running_or_notify_cancel():
+					try:
+						with profile_thread():
+							result = fn(*args, **kwargs)
+					except BaseException as e:
+						future.set_exception(e)
+					else:
+						future.set_result(result)
+			finally:
+				_local.cancelled = None
+
+				with self._lock:
+					self._threads.discard(thread)
+
+		thread = threading.Thread(target=run, daemon=True)
+
+		with self._lock:
+			self._threads.add(thread)
+
+		thread.start()
+
+		return future
+
+	def cancel(self):
+		"""Ask running calls to stop at their next check."""
+
+		self.cancelled.set()
+
+	def shutdown(self, wait=True, **kwargs):
+		if wait:
+			with self._lock:
+				threads = list(self._threads)
+
+			if threads:
+				logger.log('NORMAL', "Waiting for {} running calls to stop", len(threads))
+
+			for thread in threads:
+				thread.join()
+
+
+def _all_tasks(loop):
+	try:
+		return asyncio.all_tasks(loop)
+	except AttributeError:  # Python < 3.7
+		return asyncio.Task.all_tasks(loop)
+
+
+def run(main):
+	"""Run a command coroutine in a new event loop.
+
+	If the coroutine is interrupted or fails, its pending tasks are
+	cancelled and blocking calls still running in threads are asked to stop.
+	The threads are joined before returning or raising,
+	so nothing the coroutine started outlives it.
+
+	Parameters:
+		main (coroutine): The command coroutine.
+
+	Returns:
+		The result of ``main``.
+	"""
+
+	loop = asyncio.new_event_loop()
+	executor = _executors[loop] = _Threads()
+
+	try:
+		return loop.run_until_complete(main)
+	except BaseException:
+		executor.cancel()
+
+		tasks = [
+			task
+			for task in _all_tasks(loop)
+			if not task.done()
+		]
+
+		for task in tasks:
+			task.cancel()
+
+		if tasks:
+			loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+		raise
+	finally:
+		del _executors[loop]
+		executor.shutdown(wait=True)
+		loop.close()
+
+
+def start(coro):
+	"""Start running a coroutine concurrently in the running event loop.
+
+	Returns:
+		asyncio.Task
+	"""
+
+	return asyncio.ensure_future(coro)
+
+
+async def to_thread(func, *args, **kwargs):
+	"""Run a blocking call in a thread without blocking the event loop."""
+
+	loop = asyncio.get_event_loop()
+
+	return await loop.run_in_executor(
+		_executors.get(loop),
+		functools.partial(func, *args, **kwargs)
+	)
+
+
+async def gather(*aws):
+	"""Wait for awaitables concurrently, cancelling the rest if one fails.
+
+	Returns:
+		list: Results in the order of ``aws``.
+	"""
+
+	tasks = [asyncio.ensure_future(aw) for aw in aws]
+
+	try:
+		return await asyncio.gather(*tasks)
+	except BaseException:
+		for task in tasks:
+			task.cancel()
+
+		await asyncio.gather(*tasks, return_exceptions=True)
+
+		raise
@@ -0,0 +1,68 @@
+__all__ = [
+	'MetadataFilter',
+]
+
+import re
+
+from attr import attrib, attrs
+from google_music_utils.constants import FIELD_MAP
+from google_music_utils.utils import get_field
+
+
+def _match_field(tags, field, regex):
+	value = get_field(tags, field, field_map=FIELD_MAP)
+
+	# audio_metadata fields contain a list of values.
+	if isinstance(value, list):
+		return any(regex.search(str(v)) for v in value)
+	else:
+		return regex.search(str(value)) is not None
+
+
+@attrs(slots=True, frozen=True)
+class MetadataFilter:
+	"""A metadata filter with case-insensitive patterns compiled once.
+
+	An item matches if all inclusion conditions match
+	and no exclusion conditions match.
+
+	Parameters:
+		include (tuple): ``(field, regex)`` pairs of inclusion conditions.
+		exclude (tuple): ``(field, regex)`` pairs of exclusion conditions.
+	"""
+
+	include = attrib(default=())
+	exclude = attrib(default=())
+
+	@classmethod
+	def from_conditions(cls, conditions):
+		"""Create a filter from a list of :class:`~google_music_scripts.cli.FilterCondition`."""
+
+		include = []
+		exclude = []
+		for condition in conditions:
+			compiled = (condition.field, re.compile(condition.pattern, re.I))
+
+			if condition.oper == '+':
+				include.append(compiled)
+			elif condition.oper == '-':
+				exclude.append(compiled)
+
+		return cls(tuple(include), tuple(exclude))
+
+	def matches(self, tags):
+		"""Match item tags, ``None`` if the item's tags couldn't be loaded."""
+
+		if tags is None:
+			return not self.include
+
+		return (
+			all(
+				_match_field(tags, field, regex)
+				for field, regex in self.include
+			)
+			and not any(
+				_match_field(tags, field, regex)
+				for field, regex in self.exclude
+			)
+		)
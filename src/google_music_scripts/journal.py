@@ -0,0 +1,191 @@
+__all__ = [
+	'TransferJournal',
+]
+
+import json
+import time
+from collections.abc import Mapping
+
+from loguru import logger
+
+from .config import ensure_data_dir
+
+TRANSFER_JOURNAL_FILENAME = '{}-journal.jsonl'
+
+
+def _item_key(item):
+	if isinstance(item, Mapping):
+		return item['id']
+
+	return str(item)
+
+
+class TransferJournal:
+	"""Append-only journal of a transfer run.
+
+	The journal holds the plan of the last run of a command followed
+	by a record for each completed or failed transfer, one JSON document
+	per line. Starting a new run replaces the journal.
+
+	Items are song dicts, keyed by song ID, or filepaths.
+
+	Parameters:
+		command (str): Name of the transfer command, e.g. ``'upload'``.
+		username (str, Optional): Used to keep separate journals per user.
+		filepath (str, os.PathLike, Optional):
+			Location of the journal file.
+			Default: ``{command}-journal.jsonl`` in the user data directory.
+	"""
+
+	def __init__(self, command, *, username=None, filepath=None):
+		if filepath is None:
+			filepath = ensure_data_dir(username=username) / TRANSFER_JOURNAL_FILENAME.format(command)
+
+		self.command = command
+		self.filepath = filepath
+
+		self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _append(self, record):
+		if self._file is None:
+			self._file = open(self.filepath, 'a', encoding='utf8')
+
+		self._file.write(json.dumps(record) + '\n')
+		self._file.flush()
+
+	def _load(self):
+		"""Load the plan and the latest outcome of each item.
+
+		Returns:
+			tuple: Plan record or ``None``, and a dict of item key to error or ``None``.
+		"""
+
+		plan = None
+		outcomes = {}
+
+		try:
+			with open(self.filepath, encoding='utf8') as f:
+				for line in f:
+					try:
+						record = json.loads(line)
+					except ValueError:
+						# A partial line from an interrupted write.
+						continue
+
+					if record['event'] == 'plan':
+						plan = record
+						outcomes = {}
+					elif record['event'] == 'add':
+						if plan is None:
+							plan = {**record, 'items': []}
+
+						plan['items'].extend(record['items'])
+					else:
+						outcomes[record['key']] = record.get('error')
+		except FileNotFoundError:
+			pass
+
+		return plan, outcomes
+
+	def start(self, items):
+		"""Replace the journal with the plan of a new run."""
+
+		self.close()
+
+		with open(self.filepath, 'w', encoding='utf8') as f:
+			f.write(
+				json.dumps(
+					{
+						'event': 'plan',
+						'command': self.command,
+						'created': int(time.time()),
+						'items': [
+							item if isinstance(item, Mapping) else str(item)
+							for item in items
+						],
+					}
+				)
+				+ '\n'
+			)
+
+	def add(self, items):
+		"""Add items to the plan of the current run."""
+
+		self._append(
+			{
+				'event': 'add',
+				'command': self.command,
+				'created': int(time.time()),
+				'items': [
+					item if isinstance(item, Mapping) else str(item)
+					for item in items
+				],
+			}
+		)
+
+	def record(self, item, error=None):
+		"""Record the outcome of transferring an item.
+
+		Parameters:
+			item (dict or os.PathLike): A planned item.
+			error (Optional): The reason the transfer failed.
+				Default: Transfer completed.
+		"""
+
+		record = {
+			'event': 'completed' if error is None else 'failed',
+			'key': _item_key(item),
+		}
+
+		if error is not None:
+			record['error'] = str(error)
+
+		self._append(record)
+
+	def pending(self, *, remaining=True, failed=False):
+		"""Get planned items of the last run to transfer again.
+
+		Parameters:
+			remaining (bool, Optional): Include items without a recorded outcome.
+			failed (bool, Optional): Include items that last failed to transfer.
+
+		Returns:
+			list: Items in plan order. Filepaths are returned as strings.
+		"""
+
+		plan, outcomes = self._load()
+
+		if plan is None:
+			logger.warning("No previous {} run found in {}", self.command, self.filepath)
+
+			return []
+
+		logger.info(
+			"Loaded {} run from {}",
+			self.command,
+			time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(plan['created']))
+		)
+
+		items = []
+		for item in plan['items']:
+			key = _item_key(item)
+
+			if key not in outcomes:
+				if remaining:
+					items.append(item)
+			elif outcomes[key] is not None:
+				if failed:
+					items.append(item)
+
+		return items
+
+	def close(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
@@ -0,0 +1,387 @@
+__all__ = [
+	'PHASES',
+	'PhaseStats',
+	'Profiler',
+	'RunStats',
+	'count',
+	'increment',
+	'phase',
+	'profile_thread',
+]
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from attr import attrib, attrs
+from loguru import logger
+
+from .__about__ import __version__
+from .config import ensure_log_dir
+
+PHASES = [
+	'login',
+	'listing',
+	'scan',
+	'hash',
+	'metadata',
+	'sort',
+	'transfer',
+	'delete',
+]
+
+_profiler = None
+_stats = None
+
+# Phases can run concurrently in threads, each tracking its own.
+_local = threading.local()
+_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name):
+	"""Mark a phase of a command run.
+
+	If a :class:`RunStats` is active, the time spent in the phase
+	and anything counted with :func:`count` is added to its stats.
+	If a :class:`Profiler` restricted to the phase is active,
+	the phase is profiled.
+
+	Parameters:
+		name (str): A phase name from :data:`PHASES`.
+	"""
+
+	profiler = _profiler
+	stats = _stats
+
+	previous = getattr(_local, 'current', None)
+	current = stats.phase(name) if stats is not None else None
+	_local.current = current
+	start = time.perf_counter()
+
+	try:
+		if (
+			profiler is not None
+			and profiler.phase == name
+		):
+			with profiler.profile():
+				yield
+		else:
+			yield
+	finally:
+		if current is not None:
+			with _lock:
+				current.elapsed += time.perf_counter() - start
+				current.runs += 1
+
+		_local.current = previous
+
+
+def count(*, items=0, num_bytes=0):
+	"""Add to the counters of the running phase, if any.
+
+	Parameters:
+		items (int, Optional): Number of items processed.
+		num_bytes (int, Optional): Number of bytes read or transferred.
+	"""
+
+	current = getattr(_local, 'current', None)
+
+	if current is not None:
+		with _lock:
+			current.items += items
+			current.num_bytes += num_bytes
+
+
+def increment(name, value=1):
+	"""Add to a run-wide counter, if a :class:`RunStats` is active.
+
+	Safe to call from worker threads.
+
+	Parameters:
+		name (str): Name of the counter, e.g. ``'api_retries'``.
+		value (int, Optional): Amount to add.
+	"""
+
+	stats = _stats
+
+	if stats is not None:
+		stats.increment(name, value)
+
+
+@contextmanager
+def profile_thread():
+	"""Profile a worker thread of a command run, if a :class:`Profiler` of the whole run is active."""
+
+	profiler = _profiler
+
+	if profiler is None:
+		yield
+	else:
+		with profiler.thread():
+			yield
+
+
+def _rate(amount, elapsed):
+	return amount / elapsed if elapsed else 0
+
+
+@attrs(slots=True)
+class PhaseStats:
+	"""Time spent in and counters of a phase of a command run."""
+
+	name = attrib()
+	elapsed = attrib(default=0.0)
+	runs = attrib(default=0)
+	items = attrib(default=0)
+	num_bytes = attrib(default=0)
+
+	def to_dict(self):
+		return {
+			'name': self.name,
+			'elapsed': self.elapsed,
+			'runs': self.runs,
+			'items': self.items,
+			'bytes': self.num_bytes,
+			'items_per_second': _rate(self.items, self.elapsed),
+			'bytes_per_second': _rate(self.num_bytes, self.elapsed),
+		}
+
+
+class RunStats:
+	"""Collect the time spent in and counters of each phase of a command run.
+
+	Parameters:
+		command (str): Name of the command being run.
+	"""
+
+	def __init__(self, command):
+		self.command = command
+		self.phases = {}
+		self.started = None
+		self.elapsed = 0.0
+		self.completed = False
+		self.counters = {}
+
+		self._start = None
+		self._lock = threading.Lock()
+
+	def __enter__(self):
+		global _stats
+
+		_stats = self
+
+		self.started = time.time()
+		self._start = time.perf_counter()
+
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		global _stats
+
+		self.elapsed = time.perf_counter() - self._start
+		self.completed = exc_type is None
+
+		_stats = None
+
+	def phase(self, name):
+		"""Get the stats of a phase, added in order of first run."""
+
+		with self._lock:
+			if name not in self.phases:
+				self.phases[name] = PhaseStats(name)
+
+			return self.phases[name]
+
+	def increment(self, name, value=1):
+		with self._lock:
+			self.counters[name] = self.counters.get(name, 0) + value
+
+	def summary(self):
+		"""Get a table of phase timings and throughput followed by the counters."""
+
+		lines = [
+			f"{'Phase':<10}{'Time':>10}{'Items':>10}{'Items/s':>12}{'MB':>10}{'MB/s':>10}"
+		]
+
+		for stats in self.phases.values():
+			line = f"{stats.name:<10}{stats.elapsed:>9.2f}s"
+
+			if stats.items:
+				line += f"{stats.items:>10}{_rate(stats.items, stats.elapsed):>12.1f}"
+
+			if stats.num_bytes:
+				line = line.ljust(42)
+				line += (
+					f"{stats.num_bytes / 1000000:>10.1f}"
+					f"{_rate(stats.num_bytes, stats.elapsed) / 1000000:>10.2f}"
+				)
+
+			lines.append(line)
+
+		lines.append(f"{'Total':<10}{self.elapsed:>9.2f}s")
+
+		for name, value in sorted(self.counters.items()):
+			lines.append(f"{name:<30}{value:>10}")
+
+		return '\n'.join(lines)
+
+	def to_dict(self):
+		return {
+			'command': self.command,
+			'version': __version__,
+			'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+			'elapsed': self.elapsed,
+			'completed': self.completed,
+			'phases': [
+				stats.to_dict()
+				for stats in self.phases.values()
+			],
+			'counters': dict(sorted(self.counters.items())),
+		}
+
+	def write_json(self, filepath):
+		"""Write the stats as a JSON document to ``filepath``."""
+
+		with open(filepath, 'w', encoding='utf8') as f:
+			json.dump(self.to_dict(), f, indent=2)
+			f.write('\n')
+
+		logger.info("Saved run stats to {}", filepath)
+
+
+class Profiler:
+	"""Profile a command run or a single phase of it with cProfile.
+
+	The thread running the command or the phase is profiled, as are
+	threads running with :func:`profile_thread` when profiling the whole run.
+	Each thread has a profile of its own, merged into one when saved.
+	Work done in other worker threads or processes is seen as time waiting on them.
+
+	Parameters:
+		phase (str, Optional): A phase name from :data:`PHASES` to profile.
+			Default: Profile the whole command run.
+		top (int, Optional): Number of functions included in the summary.
+	"""
+
+	def __init__(self, phase=None, *, top=30):
+		self.phase = phase
+		self.top = top
+
+		self._profile = cProfile.Profile()
+		self._profiles = [self._profile]
+		self._profiled = False
+		self._lock = threading.Lock()
+
+	def __enter__(self):
+		global _profiler
+
+		_profiler = self
+
+		if self.phase is None:
+			self._profiled = True
+			self._profile.enable()
+
+		return self
+
+	def __exit__(self, *exc_info):
+		global _profiler
+
+		if self.phase is None:
+			self._profile.disable()
+
+		_profiler = None
+
+	@contextmanager
+	def profile(self):
+		# Runs of the phase in other threads at the same time aren't profiled.
+		if not self._lock.acquire(blocking=False):
+			yield
+			return
+
+		try:
+			self._profiled = True
+			self._profile.enable()
+
+			try:
+				yield
+			finally:
+				self._profile.disable()
+		finally:
+			self._lock.release()
+
+	@contextmanager
+	def thread(self):
+		"""Profile the current thread while active when profiling the whole run."""
+
+		if self.phase is not None:
+			yield
+			return
+
+		profile = cProfile.Profile()
+
+		try:
+			profile.enable()
+		except ValueError:
+			# Python 3.12+ profiles all threads with the run's profile.
+			yield
+			return
+
+		try:
+			yield
+		finally:
+			profile.disable()
+
+			with self._lock:
+				self._profiles.append(profile)
+
+	def _stats(self, stream=None):
+		with self._lock:
+			profiles = list(self._profiles)
+
+		return pstats.Stats(*profiles, stream=stream)
+
+	def summary(self, sort_key='cumulative'):
+		"""Get a summary of the ``top`` functions sorted by ``sort_key``."""
+
+		stream = io.StringIO()
+		stats = self._stats(stream=stream)
+		stats.sort_stats(sort_key).print_stats(self.top)
+
+		return stream.getvalue()
+
+	def save(self, username=None):
+		"""Write a pstats file and a summary to the log directory.
+
+		Returns:
+			tuple: Paths of the pstats file and the summary,
+			``None`` if the profiled phase didn't run.
+		"""
+
+		if not self._profiled:
+			logger.warning("No profile saved, phase '{}' didn't run", self.phase)
+
+			return None
+
+		log_dir = ensure_log_dir(username=username)
+		name = f"{time.strftime('%Y-%m-%d_%H-%M-%S')}_profile"
+		if self.phase is not None:
+			name += f"_{self.phase}"
+
+		stats_path = log_dir / f'{name}.pstats'
+		summary_path = log_dir / f'{name}.txt'
+
+		self._stats().dump_stats(str(stats_path))
+		summary_path.write_text(
+			self.summary('cumulative') + self.summary('tottime'),
+			encoding='utf8'
+		)
+
+		logger.info("Saved profile to {}", stats_path)
+		logger.info("Saved profile summary to {}", summary_path)
+
+		return stats_path, summary_path
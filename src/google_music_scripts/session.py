@@ -0,0 +1,114 @@
+__all__ = [
+	'Session',
+	'get_library_snapshot',
+	'get_local_index',
+	'get_mobileclient',
+	'get_musicmanager',
+]
+
+import google_music
+
+from .cache import LibrarySnapshot, LocalIndex
+
+_session = None
+
+
+class Session:
+	"""Keep clients, library snapshots, and local indexes across command runs.
+
+	While a session is active, the ``get_*`` functions return the objects
+	created by earlier runs instead of logging in or loading them again.
+	Snapshots and indexes closed by a command keep their data in memory
+	and reopen their databases when used again.
+	"""
+
+	def __init__(self):
+		self.clients = {}
+		self.library_snapshots = {}
+		self.local_indexes = {}
+
+	def __enter__(self):
+		global _session
+
+		_session = self
+
+		return self
+
+	def __exit__(self, *exc_info):
+		global _session
+
+		_session = None
+
+		self.close()
+
+	def close(self):
+		for snapshot in self.library_snapshots.values():
+			snapshot.close()
+
+		for local_index in self.local_indexes.values():
+			local_index.close()
+
+		self.clients.clear()
+		self.library_snapshots.clear()
+		self.local_indexes.clear()
+
+
+def _get_client(login, key, *args, **kwargs):
+	if _session is not None:
+		client = _session.clients.get(key)
+
+		if client is not None and client.is_authenticated:
+			return client
+
+	client = login(*args, **kwargs)
+
+	if (
+		_session is not None
+		and client.is_authenticated
+	):
+		_session.clients[key] = client
+
+	return client
+
+
+def get_musicmanager(username, *, uploader_id=None):
+	return _get_client(
+		google_music.musicmanager,
+		('musicmanager', username, uploader_id),
+		username,
+		uploader_id=uploader_id
+	)
+
+
+def get_mobileclient(username, *, device_id=None):
+	return _get_client(
+		google_music.mobileclient,
+		('mobileclient', username, device_id),
+		username,
+		device_id=device_id
+	)
+
+
+def get_library_snapshot(username, *, refresh=False, ttl=86400):
+	if _session is None:
+		return LibrarySnapshot(username=username, refresh=refresh, ttl=ttl)
+
+	snapshot = _session.library_snapshots.get(username)
+	if snapshot is None:
+		snapshot = _session.library_snapshots[username] = LibrarySnapshot(username=username)
+
+	snapshot.refresh = refresh
+	snapshot.ttl = ttl
+
+	return snapshot
+
+
+def get_local_index(username):
+	if _session is None:
+		return LocalIndex(username=username)
+
+	local_index = _session.local_indexes.get(username)
+	if local_index is None:
+		local_index = _session.local_indexes[username] = LocalIndex(username=username)
+
+	return local_index
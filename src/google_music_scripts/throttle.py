@@ -0,0 +1,265 @@
+__all__ = [
+	'AdaptiveConcurrency',
+	'Throttle',
+	'TokenBucket',
+	'error_status',
+	'is_throttled',
+	'is_transient',
+]
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+	from httpx import TransportError
+except ImportError:  # httpx < 0.14
+	from httpx import HTTPError as TransportError
+
+from .phases import increment
+
+THROTTLED_STATUS_CODES = {429, 503}
+
+
+def error_status(error):
+	"""Get the HTTP status code of an API error, ``None`` if it has no response."""
+
+	response = getattr(error, 'response', None)
+
+	return getattr(response, 'status_code', None)
+
+
+def is_throttled(error):
+	"""Check if an API error is the server asking to slow down."""
+
+	return error_status(error) in THROTTLED_STATUS_CODES
+
+
+def is_transient(error):
+	"""Check if an API call that failed with ``error`` may succeed if retried.
+
+	Throttling, server errors, timeouts, and connection errors are transient.
+	"""
+
+	if not isinstance(error, BaseException):
+		return False
+
+	status = error_status(error)
+
+	if status is not None:
+		return status in THROTTLED_STATUS_CODES or status == 408 or status >= 500
+
+	return isinstance(error, (TransportError, ConnectionError, TimeoutError))
+
+
+def _retry_after(error):
+	response = getattr(error, 'response', None)
+	headers = getattr(response, 'headers', None) or {}
+
+	try:
+		return float(headers.get('Retry-After'))
+	except (TypeError, ValueError):
+		return None
+
+
+class TokenBucket:
+	"""Limit the rate of calls across threads.
+
+	Parameters:
+		rate (float): Calls allowed per second on average.
+		burst (int, Optional): Calls allowed at once after being idle.
+			Default: ``rate`` rounded up.
+	"""
+
+	def __init__(self, rate, burst=None):
+		self.rate = rate
+		self.burst = burst if burst is not None else max(1, round(rate + 0.5))
+
+		self._tokens = self.burst
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		"""Take a token, waiting until one is available."""
+
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+			self._updated = now
+
+			# Reserve the token so waiting callers are served in turn.
+			self._tokens -= 1
+			wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+		if wait:
+			time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+	"""Limit concurrent calls, adapting the limit to server responses.
+
+	The limit is halved when a call is throttled and increased by one
+	after a limit's worth of successful calls (AIMD). Calls started
+	before the last decrease don't decrease the limit again, so a burst
+	of throttled responses only halves it once.
+
+	Parameters:
+		maximum (int): Maximum and initial concurrency limit.
+		minimum (int, Optional): Minimum concurrency limit.
+	"""
+
+	def __init__(self, maximum, *, minimum=1):
+		self.maximum = max(maximum, 1)
+		self.minimum = max(min(minimum, self.maximum), 1)
+		self.limit = self.maximum
+		self.active = 0
+
+		self._epoch = 0
+		self._successes = 0
+		self._condition = threading.Condition()
+
+	@contextmanager
+	def slot(self):
+		"""Hold one of the concurrency slots.
+
+		Yields:
+			int: Epoch the call started in, to pass to :meth:`decrease`.
+		"""
+
+		with self._condition:
+			self._condition.wait_for(lambda: self.active < self.limit)
+			self.active += 1
+			epoch = self._epoch
+
+		try:
+			yield epoch
+		finally:
+			with self._condition:
+				self.active -= 1
+				self._condition.notify_all()
+
+	def increase(self):
+		with self._condition:
+			self._successes += 1
+
+			if (
+				self.limit < self.maximum
+				and self._successes >= self.limit
+			):
+				self.limit += 1
+				self._successes = 0
+				self._condition.notify_all()
+
+	def decrease(self, epoch):
+		"""Halve the limit unless it was already decreased since ``epoch``.
+
+		Returns:
+			bool: ``True`` if the limit was decreased.
+		"""
+
+		with self._condition:
+			if (
+				epoch != self._epoch
+				or self.limit == self.minimum
+			):
+				return False
+
+			self.limit = max(self.limit // 2, self.minimum)
+			self._epoch += 1
+			self._successes = 0
+
+			return True
+
+
+class Throttle:
+	"""Rate limit, retry, and adapt the concurrency of API calls shared across threads.
+
+	Counters of calls, retries, throttled calls, and concurrency
+	decreases are added to the run stats.
+
+	Parameters:
+		workers (int): Maximum number of concurrent calls.
+		rate (float, Optional): Calls started per second.
+			Default: No limit.
+		retries (int, Optional): Number of times a call failing
+			with a transient error is retried.
+		backoff (float, Optional): Base of the exponential backoff in seconds.
+		max_backoff (float, Optional): Maximum backoff in seconds.
+	"""
+
+	def __init__(self, workers, *, rate=None, retries=2, backoff=1, max_backoff=60):
+		self.concurrency = AdaptiveConcurrency(workers)
+		self.bucket = TokenBucket(rate) if rate else None
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+	def _delay(self, attempt, error):
+		# Full jitter spreads out retries of calls that failed together.
+		delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+		retry_after = _retry_after(error)
+		if retry_after is not None:
+			delay = max(delay, min(retry_after, self.max_backoff))
+
+		return delay
+
+	def call(self, func, *args, get_error=None, **kwargs):
+		"""Call ``func`` with throttling, retrying it on transient errors.
+
+		Parameters:
+			func (callable): The API call.
+			get_error (callable, Optional): Get the error from the result
+				of a call that reports errors instead of raising them.
+				Default: Errors are raised.
+
+		Returns:
+			The result of the last attempt.
+		"""
+
+		attempt = 0
+		while True:
+			with self.concurrency.slot() as epoch:
+				if self.bucket is not None:
+					self.bucket.acquire()
+
+				increment('api_calls')
+
+				try:
+					result = func(*args, **kwargs)
+				except Exception as e:
+					if (
+						not is_transient(e)
+						or attempt >= self.retries
+					):
+						increment('api_failures')
+						raise
+
+					error = e
+				else:
+					error = get_error(result) if get_error is not None else None
+
+					if error is None:
+						self.concurrency.increase()
+
+						return result
+					elif (
+						not is_transient(error)
+						or attempt >= self.retries
+					):
+						increment('api_failures')
+
+						return result
+
+			if is_throttled(error):
+				increment('api_throttled')
+
+				if self.concurrency.decrease(epoch):
+					increment('concurrency_decreases')
+			else:
+				increment('api_transient_errors')
+
+			increment('api_retries')
+			time.sleep(self._delay(attempt, error))
+			attempt += 1
@@ -0,0 +1,526 @@
+__all__ = [
+	'SampleCache',
+	'TranscodePool',
+]
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import audio_metadata
+import google_music.clients.musicmanager as musicmanager
+import google_music_proto.musicmanager.calls as mm_calls
+from google_music_proto.musicmanager.utils import transcode_to_mp3
+from loguru import logger
+
+from .config import ensure_data_dir
+from .phases import increment
+from .utils import ByteBudget
+
+SAMPLES_DIRNAME = 'samples'
+SAMPLE_MAX_AGE = 7 * 24 * 60 * 60
+
+# Bitrate of MP3s transcoded for upload by MusicManager.upload.
+UPLOAD_QUALITY = '320k'
+UPLOAD_BYTES_PER_SECOND = 320000 // 8
+
+
+@contextmanager
+def _replace_transcoder(module, transcoder):
+	"""Replace the ``transcode_to_mp3`` used by a google-music module."""
+
+	original = module.transcode_to_mp3
+	module.transcode_to_mp3 = transcoder
+
+	try:
+		yield original
+	finally:
+		module.transcode_to_mp3 = original
+
+
+def _write_atomic(filepath, data):
+	with tempfile.NamedTemporaryFile(dir=filepath.parent, suffix='.part', delete=False) as f:
+		f.write(data)
+
+	os.replace(f.name, filepath)
+
+
+class SampleCache:
+	"""Persistent cache of audio samples sent when uploading.
+
+	Google Music asks for a sample of a time window of a song
+	before accepting the upload. Samples are stored by the song's
+	client ID and the window, so uploads retried after failing or
+	re-run with ``--retry-failed`` don't transcode the sample again.
+	Only songs with a client ID already in the local index are cached.
+	A song's samples are discarded once it's uploaded, and samples
+	older than ``max_age`` are removed when the cache is opened.
+
+	With a ``lookahead``, samples of upcoming songs are created while
+	earlier songs upload. The server picks the window of each song,
+	so they're created for the window last asked for and only used
+	if the server asks for the same window again.
+
+	Parameters:
+		local_index (LocalIndex): Index to get client IDs from.
+		username (str, Optional): Used to keep separate caches per user.
+		dirpath (str, os.PathLike, Optional): Location of the cache.
+			Default: ``samples`` in the user data directory.
+		max_age (float, Optional): Number of seconds samples are kept.
+			Default: 7 days.
+		lookahead (int, Optional): Number of upcoming songs to create samples for.
+			Default: 0 (create samples when asked for)
+	"""
+
+	def __init__(
+		self,
+		local_index,
+		username=None,
+		*,
+		dirpath=None,
+		max_age=SAMPLE_MAX_AGE,
+		lookahead=0
+	):
+		if dirpath is None:
+			dirpath = ensure_data_dir(username=username) / SAMPLES_DIRNAME
+
+		dirpath.mkdir(parents=True, exist_ok=True)
+
+		self.dirpath = dirpath
+		self.local_index = local_index
+		self.max_age = max_age
+		self.lookahead = lookahead
+
+		self._transcode = None
+		self._filepaths = {}
+		self._lock = threading.Lock()
+
+		self._upcoming = []
+		self._order = {}
+		self._next = 0
+		self._pending = {}
+		self._executor = None
+
+		self.expire()
+
+	def _sample_path(self, filepath, window):
+		client_id = self.local_index.cached_client_id(filepath)
+
+		if client_id is None:
+			return None
+
+		key = ':'.join(str(part) for part in (client_id, *window))
+
+		return self.dirpath / f'{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.mp3'
+
+	def expire(self):
+		"""Remove samples older than ``max_age``."""
+
+		cutoff = time.time() - self.max_age
+
+		for path in self.dirpath.iterdir():
+			try:
+				if path.stat().st_mtime < cutoff:
+					path.unlink()
+			except OSError:
+				pass
+
+	def _ahead(self, filepath, window):
+		index = self._order.get(filepath)
+
+		if index is None:
+			return
+
+		with self._lock:
+			if self._executor is None:
+				return
+
+			start = max(self._next, index + 1)
+			stop = min(index + 1 + self.lookahead, len(self._upcoming))
+			self._next = max(self._next, stop)
+
+			for upcoming in self._upcoming[start:stop]:
+				sample_path = self._sample_path(upcoming, window)
+
+				if (
+					sample_path is None
+					or sample_path in self._pending
+				):
+					continue
+
+				self._filepaths.setdefault(upcoming, set()).add(sample_path)
+				self._pending[sample_path] = self._executor.submit(
+					self._create,
+					upcoming,
+					sample_path,
+					window
+				)
+
+	def _create(self, filepath, sample_path, window):
+		slice_start, slice_duration, quality = window
+
+		try:
+			if not sample_path.exists():
+				# The module's transcoder, not the installed one.
+				sample = transcode_to_mp3(
+					str(filepath),
+					slice_start=slice_start,
+					slice_duration=slice_duration,
+					quality=quality
+				)
+				_write_atomic(sample_path, sample)
+				increment('samples_created_ahead')
+		finally:
+			with self._lock:
+				self._pending.pop(sample_path, None)
+
+	def transcode(self, song, *, slice_start=None, slice_duration=None, quality='320k'):
+		"""Drop-in replacement of ``transcode_to_mp3`` serving samples from the cache."""
+
+		sample_path = None
+		if (
+			slice_start is not None
+			and slice_duration is not None
+			and isinstance(song, audio_metadata.Format)
+		):
+			filepath = Path(song.filepath)
+			window = (slice_start, slice_duration, quality)
+
+			if self.lookahead:
+				self._ahead(filepath, window)
+
+			sample_path = self._sample_path(filepath, window)
+
+		if sample_path is None:
+			return self._transcode(
+				song,
+				slice_start=slice_start,
+				slice_duration=slice_duration,
+				quality=quality
+			)
+
+		with self._lock:
+			self._filepaths.setdefault(filepath, set()).add(sample_path)
+			future = self._pending.get(sample_path)
+
+		# A sample being created ahead is waited on instead of transcoded twice.
+		# One that hasn't started yet is created here instead.
+		if (
+			future is not None
+			and not future.cancel()
+		):
+			try:
+				future.result()
+			except Exception as e:  # TODO: More specific exception.
+				logger.debug("Creating sample ahead failed for {}: {}", song.filepath, e)
+
+		try:
+			sample = sample_path.read_bytes()
+		except OSError:
+			pass
+		else:
+			increment('samples_cached')
+
+			return sample
+
+		sample = self._transcode(
+			song,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality
+		)
+		increment('samples_generated')
+
+		try:
+			_write_atomic(sample_path, sample)
+		except OSError:
+			pass
+
+		return sample
+
+	@contextmanager
+	def installed(self, filepaths=()):
+		"""Serve samples generated by uploads from the cache while active.
+
+		Parameters:
+			filepaths (list, Optional): Songs in upload order
+				to create samples for ahead of their uploads.
+		"""
+
+		with _replace_transcoder(mm_calls, self.transcode) as original:
+			self._transcode = original
+
+			self._upcoming = [Path(filepath) for filepath in filepaths]
+			self._order = {
+				filepath: index
+				for index, filepath in enumerate(self._upcoming)
+			}
+			self._next = 0
+
+			if self.lookahead:
+				# Samples are created by ffmpeg/avconv processes these threads wait on.
+				self._executor = ThreadPoolExecutor(
+					max_workers=min(self.lookahead, os.cpu_count() or 1)
+				)
+
+			try:
+				yield self
+			finally:
+				with self._lock:
+					executor = self._executor
+					futures = list(self._pending.values())
+
+					self._executor = None
+					self._pending.clear()
+
+				for future in futures:
+					future.cancel()
+
+				if executor is not None:
+					executor.shutdown(wait=True)
+
+				self._upcoming = []
+				self._order = {}
+				self._transcode = None
+
+	def discard(self, filepath):
+		"""Remove the cached samples of an uploaded song."""
+
+		with self._lock:
+			sample_paths = self._filepaths.pop(Path(filepath), ())
+
+		for sample_path in sample_paths:
+			try:
+				sample_path.unlink()
+			except OSError:
+				pass
+
+
+def _estimate_size(filepath):
+	"""Estimate the size of a song transcoded for upload."""
+
+	try:
+		duration = audio_metadata.load(filepath).streaminfo.duration
+	except Exception:  # TODO: More specific exception.
+		duration = None
+
+	if duration:
+		return int(duration * UPLOAD_BYTES_PER_SECOND)
+
+	try:
+		return os.path.getsize(filepath)
+	except OSError:
+		return 0
+
+
+class TranscodePool:
+	"""Transcode songs to MP3 ahead of uploading them.
+
+	:meth:`MusicManager.upload <google_music.MusicManager.upload>` transcodes
+	songs that aren't MP3 in the uploading thread. The pool transcodes them
+	concurrently, in upload order, into a scratch directory limited to
+	``max_bytes``, and uploads use the transcoded file while it's installed.
+	Songs are transcoded even if they end up matched instead of uploaded,
+	and retried uploads transcode the song themselves.
+
+	Parameters:
+		filepaths (list): Songs in upload order. MP3s are skipped.
+		workers (int, Optional): Number of songs transcoded at once.
+			Default: Number of CPUs.
+		max_bytes (int, Optional): Maximum size of transcoded songs kept
+			in the scratch directory. A single larger song is allowed.
+			Default: No limit.
+		dirpath (str, os.PathLike, Optional): Parent of the scratch directory.
+			Default: The system temporary directory.
+	"""
+
+	def __init__(self, filepaths, *, workers=None, max_bytes=None, dirpath=None):
+		self.workers = workers or os.cpu_count() or 1
+		self.scratch_dir = Path(tempfile.mkdtemp(prefix='gms-transcode-', dir=dirpath))
+
+		self._budget = ByteBudget(max_bytes)
+		self._futures = {}
+		self._sizes = {}
+		self._lock = threading.Lock()
+		self._closed = False
+		self._transcode = None
+
+		for filepath in filepaths:
+			if Path(filepath).suffix.lower() != '.mp3':
+				self._futures[Path(filepath)] = Future()
+
+		self._executor = ThreadPoolExecutor(max_workers=self.workers)
+		self._dispatcher = threading.Thread(
+			target=self._dispatch,
+			args=(list(self._futures),),
+			daemon=True
+		)
+
+	def __enter__(self):
+		self._dispatcher.start()
+
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _dispatch(self, filepaths):
+		# Space is reserved in upload order, so the song an upload
+		# is waiting on never waits behind songs queued after it.
+		for filepath in filepaths:
+			size = _estimate_size(filepath)
+			self._budget.acquire(size)
+
+			with self._lock:
+				if self._closed:
+					self._budget.release(size)
+					break
+
+				future = self._futures.get(filepath)
+				if (
+					future is None
+					or future.cancelled()
+				):
+					# Already uploaded or being transcoded by its upload.
+					self._budget.release(size)
+					continue
+
+				self._sizes[filepath] = size
+
+			self._executor.submit(self._run, filepath, future)
+
+	def _run(self, filepath, future):
+		if not future.set_running_or_notify_cancel():
+			with self._lock:
+				size = self._sizes.pop(filepath, None)
+
+			if size is not None:
+				self._budget.release(size)
+
+			return
+
+		try:
+			# The module's transcoder, not the installed one waiting on this song.
+			data = transcode_to_mp3(filepath, quality=UPLOAD_QUALITY)
+
+			with tempfile.NamedTemporaryFile(
+				dir=self.scratch_dir,
+				suffix='.mp3',
+				delete=False
+			) as f:
+				f.write(data)
+		except BaseException as e:
+			future.set_exception(e)
+			return
+
+		scratch_path = Path(f.name)
+
+		with self._lock:
+			discarded = filepath not in self._futures
+
+		if discarded:
+			scratch_path.unlink()
+		else:
+			increment('songs_pretranscoded')
+
+		future.set_result(scratch_path)
+
+	def transcode(self, song, *, slice_start=None, slice_duration=None, quality='320k'):
+		"""Drop-in replacement of ``transcode_to_mp3`` using songs transcoded by the pool."""
+
+		future = None
+		if (
+			slice_start is None
+			and slice_duration is None
+			and quality == UPLOAD_QUALITY
+			and isinstance(song, audio_metadata.Format)
+		):
+			future = self._futures.get(Path(song.filepath))
+
+		# A song the pool hasn't started on is transcoded here instead,
+		# so a pool that can't keep up is no slower than not having one.
+		if (
+			future is not None
+			and not future.cancel()
+		):
+			try:
+				data = future.result().read_bytes()
+			except Exception as e:  # TODO: More specific exception.
+				logger.debug("Transcoding ahead failed for {}: {}", song.filepath, e)
+			else:
+				self.discard(song.filepath)
+
+				return data
+
+		return self._transcode(
+			song,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality
+		)
+
+	@contextmanager
+	def installed(self):
+		"""Use songs transcoded by the pool for uploads while active."""
+
+		with _replace_transcoder(musicmanager, self.transcode) as original:
+			self._transcode = original
+
+			try:
+				yield self
+			finally:
+				self._transcode = None
+
+	def discard(self, filepath):
+		"""Free the space of a song once it's been read or is done uploading."""
+
+		filepath = Path(filepath)
+
+		with self._lock:
+			future = self._futures.pop(filepath, None)
+			size = self._sizes.pop(filepath, None)
+
+		if future is None:
+			return
+
+		# A song still transcoding is removed when it finishes.
+		if (
+			not future.cancel()
+			and future.done()
+			and future.exception() is None
+		):
+			try:
+				future.result().unlink()
+			except OSError:
+				pass
+
+		if size is not None:
+			self._budget.release(size)
+
+	def close(self):
+		with self._lock:
+			self._closed = True
+			futures = list(self._futures.values())
+			sizes = list(self._sizes.values())
+
+			self._futures.clear()
+			self._sizes.clear()
+
+		for future in futures:
+			future.cancel()
+
+		# Free reserved space so a dispatcher waiting for it sees the pool is closed.
+		for size in sizes:
+			self._budget.release(size)
+
+		if self._dispatcher.is_alive():
+			self._dispatcher.join()
+
+		self._executor.shutdown(wait=True)
+		shutil.rmtree(self.scratch_dir, ignore_errors=True)
@@ -1,14 +1,61 @@
 __all__ = [
+	'AlbumArtCache',
+	'ByteBudget',
 	'get_album_art_path',
 	'template_to_base_path',
 ]
 
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 import google_music_utils as gm_utils
 
 
+class ByteBudget:
+	"""Limit the total size of items in flight across threads.
+
+	An item larger than the limit is allowed when nothing else is in flight.
+
+	Parameters:
+		limit (int, Optional): Maximum number of bytes in flight.
+			Default: No limit.
+	"""
+
+	def __init__(self, limit=None):
+		self.limit = limit
+		self.in_flight = 0
+
+		self._condition = threading.Condition()
+
+	def acquire(self, size):
+		with self._condition:
+			if self.limit is not None:
+				self._condition.wait_for(
+					lambda: (
+						self.in_flight == 0
+						or self.in_flight + size <= self.limit
+					)
+				)
+
+			self.in_flight += size
+
+	def release(self, size):
+		with self._condition:
+			self.in_flight -= size
+			self._condition.notify_all()
+
+	@contextmanager
+	def reserve(self, size):
+		self.acquire(size)
+
+		try:
+			yield
+		finally:
+			self.release(size)
+
+
 def get_album_art_path(song, album_art_paths):
 	album_art_path = None
 	if album_art_paths:
@@ -28,6 +75,30 @@ def get_album_art_path(song, album_art_paths):
 	return album_art_path
 
 
+class AlbumArtCache:
+	"""Resolve album art for songs once per directory.
+
+	Parameters:
+		album_art_paths (list, Optional): Candidate album art paths
+			as given to :func:`get_album_art_path`.
+	"""
+
+	def __init__(self, album_art_paths=None):
+		self.album_art_paths = album_art_paths or []
+
+		self._directories = {}
+
+	def get(self, song):
+		"""Get the album art path of a song, ``None`` if there isn't any."""
+
+		dirpath = song.parent
+
+		if dirpath not in self._directories:
+			self._directories[dirpath] = get_album_art_path(song, self.album_art_paths)
+
+		return self._directories[dirpath]
+
+
 def template_to_base_path(template, google_songs):
 	"""Get base output path for a list of songs for download."""
 
@@ -0,0 +1,352 @@
+__all__ = [
+	'InotifyWatcher',
+	'PollingWatcher',
+	'watch_paths',
+]
+
+import abc
+import ctypes
+import ctypes.util
+import math
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+# Seconds between polls when inotify isn't available.
+DEFAULT_POLL_INTERVAL = 30
+
+# inotify(7) constants.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def _signature(filepath):
+	try:
+		stat = os.stat(filepath)
+	except OSError:
+		return None
+
+	return stat.st_size, stat.st_mtime_ns
+
+
+def _walk(dirpath, max_depth, depth=0):
+	"""Yield ``(dirpath, depth, filepaths)`` for a directory tree down to ``max_depth``."""
+
+	filepaths = []
+	dirpaths = []
+
+	try:
+		with os.scandir(dirpath) as entries:
+			for entry in entries:
+				try:
+					if entry.is_dir(follow_symlinks=False):
+						dirpaths.append(entry.path)
+					elif entry.is_file():
+						filepaths.append(Path(entry.path))
+				except OSError:
+					continue
+	except OSError as e:
+		logger.debug("Failed to scan {}: {}", dirpath, e)
+
+		return
+
+	yield dirpath, depth, filepaths
+
+	if depth < max_depth:
+		for subdirpath in dirpaths:
+			yield from _walk(subdirpath, max_depth, depth + 1)
+
+
+class _Watcher(abc.ABC):
+	def __init__(self, paths, *, max_depth=math.inf):
+		self.roots = [Path(path).resolve() for path in paths]
+		self.max_depth = max_depth
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	@abc.abstractmethod
+	def read(self, timeout=None):
+		"""Wait for changes.
+
+		Parameters:
+			timeout (float, Optional): Seconds to wait for changes.
+				Default: Wait until there are changes.
+
+		Returns:
+			list: ``(root, filepath)`` of new or modified files.
+		"""
+
+	def close(self):
+		pass
+
+	def batches(self, delay):
+		"""Yield new or modified files once they stop changing.
+
+		A file is settled when its size and modification time haven't
+		changed for ``delay`` seconds, so files still being written,
+		copied, or tagged aren't picked up partway.
+
+		Parameters:
+			delay (float): Seconds a file must be unchanged.
+
+		Yields:
+			tuple: ``(root, filepaths)`` of settled files grouped by watched path.
+		"""
+
+		# filepath: [root, signature, monotonic time of last change]
+		pending = {}
+
+		while True:
+			timeout = None
+			if pending:
+				timeout = max(
+					min(entry[2] for entry in pending.values()) + delay - time.monotonic(),
+					0
+				)
+
+			for root, filepath in self.read(timeout):
+				pending[filepath] = [root, _signature(filepath), time.monotonic()]
+
+			now = time.monotonic()
+			settled = {}
+			for filepath, entry in list(pending.items()):
+				root, signature, changed = entry
+				current = _signature(filepath)
+
+				if current is None:
+					del pending[filepath]
+				elif current != signature:
+					entry[1] = current
+					entry[2] = now
+				elif now - changed >= delay:
+					del pending[filepath]
+					settled.setdefault(root, []).append(filepath)
+
+			for root, filepaths in settled.items():
+				yield root, sorted(filepaths)
+
+
+class InotifyWatcher(_Watcher):
+	"""Watch directory trees for new or modified files with Linux inotify.
+
+	Directories created or moved into a tree are watched as they appear
+	and the files already in them are reported.
+
+	Parameters:
+		paths (list): Directories to watch.
+		max_depth (int, Optional): Number of subdirectory levels to watch.
+			Default: No limit.
+
+	Raises:
+		OSError: If inotify isn't available or a directory can't be watched.
+	"""
+
+	def __init__(self, paths, *, max_depth=math.inf):
+		super().__init__(paths, max_depth=max_depth)
+
+		self._fd = None
+
+		if not sys.platform.startswith('linux'):
+			raise OSError("inotify isn't supported on this platform")
+
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+		try:
+			self._inotify_init1 = libc.inotify_init1
+			self._inotify_add_watch = libc.inotify_add_watch
+		except AttributeError:
+			raise OSError("inotify isn't supported by the C library")
+
+		fd = self._inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if fd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno))
+
+		self._fd = fd
+
+		# watch descriptor: (root, dirpath, depth)
+		self._watches = {}
+
+		try:
+			for root in self.roots:
+				self._add_tree(root, root, 0)
+		except OSError:
+			self.close()
+			raise
+
+	def _add_watch(self, root, dirpath, depth):
+		wd = self._inotify_add_watch(self._fd, os.fsencode(dirpath), INOTIFY_MASK)
+		if wd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, f"Failed to watch {dirpath}: {os.strerror(errno)}")
+
+		self._watches[wd] = (root, dirpath, depth)
+
+	def _add_tree(self, root, dirpath, depth):
+		"""Watch a directory tree and get the files already in it."""
+
+		filepaths = []
+		for subdirpath, subdepth, subfilepaths in _walk(dirpath, self.max_depth, depth):
+			self._add_watch(root, subdirpath, subdepth)
+			filepaths.extend(subfilepaths)
+
+		return filepaths
+
+	def _read_events(self):
+		data = b''
+		while True:
+			try:
+				chunk = os.read(self._fd, 65536)
+			except BlockingIOError:
+				break
+
+			if not chunk:
+				break
+
+			data += chunk
+
+		offset = 0
+		while offset < len(data):
+			wd, mask, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+			offset += INOTIFY_EVENT.size
+			name = data[offset:offset + name_len].rstrip(b'\x00')
+			offset += name_len
+
+			yield wd, mask, os.fsdecode(name)
+
+	def read(self, timeout=None):
+		ready, _, _ = select.select([self._fd], [], [], timeout)
+		if not ready:
+			return []
+
+		changes = []
+		for wd, mask, name in self._read_events():
+			if mask & IN_Q_OVERFLOW:
+				logger.warning("Missed file system events, rescanning watched paths")
+
+				for root in self.roots:
+					for _, _, filepaths in _walk(root, self.max_depth):
+						changes.extend((root, filepath) for filepath in filepaths)
+
+				continue
+
+			if mask & IN_IGNORED:
+				self._watches.pop(wd, None)
+				continue
+
+			if wd not in self._watches:
+				continue
+
+			root, dirpath, depth = self._watches[wd]
+			path = Path(dirpath) / name
+
+			if mask & IN_ISDIR:
+				if depth < self.max_depth:
+					try:
+						filepaths = self._add_tree(root, path, depth + 1)
+					except OSError as e:
+						logger.warning(e)
+					else:
+						changes.extend((root, filepath) for filepath in filepaths)
+			else:
+				changes.append((root, path))
+
+		return changes
+
+	def close(self):
+		if self._fd is not None:
+			os.close(self._fd)
+			self._fd = None
+
+
+class PollingWatcher(_Watcher):
+	"""Watch directory trees for new or modified files by rescanning them.
+
+	Used where inotify isn't available or doesn't see changes,
+	e.g. network file systems.
+
+	Parameters:
+		paths (list): Directories to watch.
+		max_depth (int, Optional): Number of subdirectory levels to watch.
+			Default: No limit.
+		interval (float, Optional): Seconds between scans.
+	"""
+
+	def __init__(self, paths, *, max_depth=math.inf, interval=DEFAULT_POLL_INTERVAL):
+		super().__init__(paths, max_depth=max_depth)
+
+		self.interval = interval
+
+		self._signatures = self._scan()
+		self._next_poll = time.monotonic() + interval
+
+	def _scan(self):
+		signatures = {}
+		for root in self.roots:
+			for _, _, filepaths in _walk(root, self.max_depth):
+				for filepath in filepaths:
+					signature = _signature(filepath)
+
+					if signature is not None:
+						signatures[filepath] = (root, signature)
+
+		return signatures
+
+	def read(self, timeout=None):
+		# Changes are only seen by scanning,
+		# so waiting less than the interval is pointless.
+		time.sleep(max(self._next_poll - time.monotonic(), 0))
+		self._next_poll = time.monotonic() + self.interval
+
+		previous = self._signatures
+		self._signatures = self._scan()
+
+		return [
+			(root, filepath)
+			for filepath, (root, signature) in self._signatures.items()
+			if previous.get(filepath, (None, None))[1] != signature
+		]
+
+
+def watch_paths(paths, *, max_depth=math.inf, poll_interval=None):
+	"""Create a watcher for directory trees.
+
+	Parameters:
+		paths (list): Directories to watch.
+		max_depth (int, Optional): Number of subdirectory levels to watch.
+			Default: No limit.
+		poll_interval (float, Optional): Poll for changes every ``poll_interval`` seconds.
+			Default: Use inotify, falling back to polling
+			every ``DEFAULT_POLL_INTERVAL`` seconds if it isn't available.
+
+	Returns:
+		InotifyWatcher or PollingWatcher
+	"""
+
+	if poll_interval is None:
+		try:
+			return InotifyWatcher(paths, max_depth=max_depth)
+		except OSError as e:
+			logger.info("Falling back to polling for changes: {}", e)
+
+			poll_interval = DEFAULT_POLL_INTERVAL
+
+	return PollingWatcher(paths, max_depth=max_depth, interval=poll_interval)